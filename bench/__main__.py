@@ -0,0 +1,258 @@
+import io
+import os
+import sys
+import json
+import time
+import pickle
+import random
+import platform
+import tracemalloc
+import argparse
+import tempfile
+
+import numpy as np
+
+import cedict
+import htmlgen
+import radicals
+import font_variations
+from cedict2pinyin import add_accents
+from database import CharStats
+from bench import synthetic
+
+# Benchmarks for the hot paths, run on synthetic data (see synthetic.py).
+#
+#   python3 -m bench [--quick] [--repeat N] [--only NAME,...] [--out results.json]
+#   python3 -m bench compare old.json new.json
+#
+# Each case is a function taking the data directory and its size parameter, returning a function
+# to time. Cases are set up again before every repeat (so ones that modify the db start from the
+# same state), and the fastest repeat is reported.
+
+SIZES = {
+    # name: (quick, full)
+    "cedict_entries": (20000, 120000), # real CC-CEDICT has about 120k entries
+    "corpus_bytes":   (1000000, 8000000),
+    "db_chars":       ([1000, 10000], [1000, 10000, 100000]),
+    "summary_words":  (5000, 5000),
+    "sheets":         (365, 365),       # a year of daily sheets
+    "rads_chars":     (5000, 30000),
+    "cmap_chars":     (20000, 65000),
+}
+
+SHEET_CHARS = 30
+
+# generated data files, shared by all cases
+class Data:
+    def __init__(self, path, sizes, seed):
+        self.path  = path
+        self.sizes = sizes
+        self.seed  = seed
+
+        self.cedict_path = os.path.join(path, "cedict.txt")
+        self.words = synthetic.cedict_file(self.cedict_path, sizes["cedict_entries"], seed=seed)
+
+        self.corpus_path = os.path.join(path, "corpus.txt")
+        synthetic.corpus_file(self.corpus_path, sizes["corpus_bytes"], seed=seed)
+
+        self.rads_path = os.path.join(path, "rads.json")
+        synthetic.rads_json(self.rads_path, sizes["rads_chars"], seed=seed)
+
+        self.cmap_path = os.path.join(path, "cmap.txt")
+        synthetic.cmap_file(self.cmap_path, sizes["cmap_chars"], seed=seed)
+
+        self._defs = None
+        self._rads = None
+        self._pinyin = None
+
+    def defs(self):
+        if self._defs is None:
+            self._defs = cedict.load(self.cedict_path)
+        return self._defs
+
+    def rads(self):
+        if self._rads is None:
+            self._rads = radicals.load_from_json(self.rads_path)
+        return self._rads
+
+    # pinyin.json format: char -> list of accented readings
+    def pinyin(self):
+        if self._pinyin is None:
+            rng = random.Random(self.seed)
+            self._pinyin = {c: [add_accents(synthetic.syllable(rng))]
+                            for c in synthetic.hanzi(max(self.sizes["db_chars"]))}
+        return self._pinyin
+
+###########
+# Cases   #
+###########
+
+def case_cedict_load(data, size):
+    return lambda: cedict.load(data.cedict_path)
+
+def case_add_text(data, size):
+    db = synthetic.database(0)
+    return lambda: db.add_text(data.corpus_path, "bench")
+
+def case_load_db(data, size):
+    db_bytes = pickle.dumps(synthetic.database(size, seed=data.seed))
+    return lambda: pickle.loads(db_bytes)
+
+def case_generate(data, size):
+    db = synthetic.database(size, seed=data.seed)
+    return lambda: db.generate(SHEET_CHARS)
+
+def case_charsheet(data, size):
+    rng    = random.Random(data.seed)
+    pinyin = data.pinyin()
+    pool   = list(pinyin)
+    sheets = [rng.sample(pool, SHEET_CHARS) for _ in range(size)]
+    def run():
+        for chars in sheets:
+            htmlgen.charsheet(chars, 10, 2, pinyin, io.StringIO(), "bench", "2020-02-01")
+    return run
+
+def case_summary(data, size):
+    defs  = data.defs()
+    words = random.Random(data.seed).sample(list(defs), min(size, len(defs)))
+    return lambda: htmlgen.summary(words, defs, io.StringIO(), "bench")
+
+def case_characters_within(data, size):
+    rads  = data.rads()
+    chars = [c for c in rads if rads[c][radicals.PARENT_INDEX]]
+    chars = random.Random(data.seed).sample(chars, min(200, len(chars)))
+    def run():
+        for c in chars:
+            list(radicals.characters_within(rads, c, 2.5))
+    return run
+
+def case_enumerate_sorted(data, size):
+    rads = data.rads()
+    return lambda: list(radicals.enumerate_sorted(rads))
+
+def case_process_cmap_file(data, size):
+    return lambda: font_variations.process_cmap_file(data.cmap_path)
+
+# name: (case function, size parameter name or None)
+CASES = {
+    "cedict.load":                       (case_cedict_load,        "cedict_entries"),
+    "database.add_text":                 (case_add_text,           "corpus_bytes"),
+    "database.load":                     (case_load_db,            "db_chars"),
+    "database.generate":                 (case_generate,           "db_chars"),
+    "htmlgen.charsheet":                 (case_charsheet,          "sheets"),
+    "htmlgen.summary":                   (case_summary,            "summary_words"),
+    "radicals.characters_within":        (case_characters_within,  "rads_chars"),
+    "radicals.enumerate_sorted":         (case_enumerate_sorted,   "rads_chars"),
+    "font_variations.process_cmap_file": (case_process_cmap_file,  "cmap_chars"),
+}
+
+###########
+# Running #
+###########
+
+def run_case(data, case, size, repeat):
+    runs = []
+    for _ in range(repeat):
+        fn = case(data, size)
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {"seconds": min(runs), "runs": runs, "size": size}
+
+def run(sizes, repeat=3, only=None, seed=0):
+    results = dict()
+    with tempfile.TemporaryDirectory() as path:
+        sys.stderr.write("Generating synthetic data in {}\n".format(path))
+        data = Data(path, sizes, seed)
+
+        for name, (case, size_name) in CASES.items():
+            if only and name not in only:
+                continue
+            size = sizes[size_name]
+            # cases with a list of sizes are run once per size, as "name[size]"
+            for s in (size if isinstance(size, list) else [size]):
+                key = "{}[{}]".format(name, s) if isinstance(size, list) else name
+                results[key] = run_case(data, case, s, repeat)
+                sys.stderr.write("{:45} {:10.4f}s\n".format(key, results[key]["seconds"]))
+
+    return results
+
+# memory used by the chars dict of databases of each size, and the size of their pickle
+def measure_memory(sizes, seed=0):
+    results = dict()
+    for size in sizes["db_chars"]:
+        db = synthetic.database(size, seed=seed)
+        stats = [(c, tuple(d)) for c, d in db.chars.items()]
+
+        tracemalloc.start()
+        chars = {c: CharStats(*d) for c, d in stats}
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        key = "database[{}]".format(size)
+        results[key] = {"pickle_bytes": len(pickle.dumps(db)), "chars_bytes": memory}
+        sys.stderr.write("{:45} {:10} bytes in memory, {} bytes pickled\n".format(
+            key, memory, results[key]["pickle_bytes"]))
+    return results
+
+# print a table of timings of two result files, and the ratio new/old
+def compare(old_path, new_path):
+    old = json.load(open(old_path))["results"]
+    new = json.load(open(new_path))["results"]
+    print("{:45} {:>10} {:>10} {:>7}".format("name", "old", "new", "ratio"))
+    for name in sorted(set(old) | set(new)):
+        a = old[name]["seconds"] if name in old else None
+        b = new[name]["seconds"] if name in new else None
+        ratio = "{:7.2f}".format(b / a) if a and b else "      -"
+        print("{:45} {:>10} {:>10} {}".format(
+            name,
+            "{:.4f}".format(a) if a is not None else "-",
+            "{:.4f}".format(b) if b is not None else "-",
+            ratio))
+
+def main(argv):
+    if len(argv) and argv[0] == "compare":
+        if len(argv) != 3:
+            print("Usage: python3 -m bench compare old.json new.json")
+            return 1
+        compare(argv[1], argv[2])
+        return 0
+
+    parser = argparse.ArgumentParser(prog="python3 -m bench")
+    parser.add_argument("--quick", action="store_true", help="use smaller inputs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="comma-separated case names to run")
+    parser.add_argument("--out", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    sizes = {name: size[0 if args.quick else 1] for name, size in SIZES.items()}
+    only  = set(args.only.split(',')) if args.only else None
+
+    results = run(sizes, args.repeat, only, args.seed)
+    memory  = measure_memory(sizes, args.seed)
+
+    output = {
+        "meta": {
+            "time":     time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python":   platform.python_version(),
+            "numpy":    np.__version__,
+            "platform": platform.platform(),
+            "sizes":    sizes,
+            "repeat":   args.repeat,
+            "seed":     args.seed,
+        },
+        "results": results,
+        "memory":  memory,
+    }
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=1)
+    else:
+        print(json.dumps(output, indent=1))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,189 @@
+import json
+import random
+import hashlib
+import itertools
+
+from database import Database, CharStats, DEFAULT_BLACKLIST
+from blacklist import Blacklist
+from phonetic import CONSONANT_TABLE
+
+# Generators for synthetic versions of the data files that can't be distributed.
+# Everything takes a seed so the same inputs are produced on every run.
+
+# CJK blocks as accepted by charhandling.is_hanzi, in the order characters are taken from them
+# (the common block first, so small inputs look like real text)
+HANZI_RANGES = [
+    (0x4E00,  0x9FFF),
+    (0x3400,  0x4DBF),
+    (0xF900,  0xFAFF),
+    (0x20000, 0x2FA1F),
+]
+
+# the first n hanzi, in HANZI_RANGES order (there are only about 92k, larger n gives all of them)
+def hanzi(n):
+    chars = []
+    for begin, end in HANZI_RANGES:
+        for codepoint in range(begin, end + 1):
+            if len(chars) >= n:
+                return chars
+            chars.append(chr(codepoint))
+    return chars
+
+# cumulative weights (for random.choices) making the i'th character about 1/(i+1) as frequent as
+# the first, like real text
+def zipf_cum_weights(n):
+    return list(itertools.accumulate(1 / (i + 1) for i in range(n)))
+
+INITIALS = [i for i in CONSONANT_TABLE if i != 'NONE'] + ['']
+FINALS   = ['a', 'o', 'e', 'i', 'u', 'ai', 'ei', 'ao', 'ou', 'an', 'en', 'ang', 'eng', 'ong',
+            'ia', 'ie', 'iao', 'iu', 'ian', 'in', 'iang', 'ing', 'ua', 'uo', 'uai', 'ui', 'uan',
+            'un', 'uang', 'u:', 'u:e']
+
+def syllable(rng):
+    return rng.choice(INITIALS) + rng.choice(FINALS) + str(rng.randint(1, 5))
+
+###########
+# CEDICT  #
+###########
+
+# write a CEDICT-format dictionary with n_entries entries built from n_chars distinct characters.
+# about a quarter of the entries are single characters, the rest are 2-4 character words.
+# returns the list of headwords.
+def cedict_file(path, n_entries, n_chars=6000, seed=0):
+    rng   = random.Random(seed)
+    chars = hanzi(n_chars)
+    weights = zipf_cum_weights(n_chars)
+    words = []
+
+    with open(path, 'w') as f:
+        f.write("# synthetic CC-CEDICT\n#! version=1\n")
+        for i in range(n_entries):
+            if i < n_chars and rng.random() < 0.25:
+                word = chars[i]
+            else:
+                word = "".join(rng.choices(chars, cum_weights=weights, k=rng.randint(2, 4)))
+            pinyin = " ".join(syllable(rng) for _ in word)
+            definitions = "/".join(
+                "synthetic definition {} of {}".format(d, i) if rng.random() < 0.9
+                else "variant of {}".format(word)
+                for d in range(rng.randint(1, 6)))
+            f.write("{} {} [{}] /{}/\n".format(word, word, pinyin, definitions))
+            words.append(word)
+
+    return words
+
+############
+# Radicals #
+############
+
+COMPOSITION_TYPES = "⿰⿱⿲⿳⿴⿵⿶⿷⿸⿹⿺⿻"
+
+# write a random radical DAG in rads.json format:
+#   char -> [num_strokes, composition_type, left_parent(, right_parent)]
+# the first n_roots characters have no parents (left parent is itself), every later character
+# is composed of two earlier characters, so the graph is acyclic.
+def rads_json(path, n_chars, n_roots=200, seed=0):
+    rng   = random.Random(seed)
+    chars = hanzi(n_chars)
+    rads  = dict()
+
+    for i, char in enumerate(chars):
+        if i < n_roots:
+            rads[char] = [rng.randint(1, 6), COMPOSITION_TYPES[0], char]
+        else:
+            left, right = rng.choices(chars[:i], k=2)
+            strokes = min(30, rads[left][0] + rads[right][0])
+            rads[char] = [strokes, rng.choice(COMPOSITION_TYPES), left, right]
+
+    with open(path, 'w') as f:
+        json.dump(rads, f, ensure_ascii=False)
+
+    return chars
+
+##########
+# Corpus #
+##########
+
+PUNCTUATION = "，。、！？：；“”（）"
+
+# write roughly size_bytes of UTF-8 text drawn from n_chars characters with Zipf frequencies,
+# with punctuation, latin text and newlines mixed in like pdftotext output.
+def corpus_file(path, size_bytes, n_chars=3000, seed=0):
+    rng     = random.Random(seed)
+    chars   = hanzi(n_chars)
+    weights = zipf_cum_weights(n_chars)
+
+    written = 0
+    with open(path, 'w') as f:
+        while written < size_bytes:
+            line = "".join(rng.choices(chars, cum_weights=weights, k=rng.randint(10, 60)))
+            line += rng.choice(PUNCTUATION) + " Lesson {} page {}\n".format(
+                rng.randint(1, 30), rng.randint(1, 200))
+            f.write(line)
+            written += len(line.encode('utf-8'))
+
+############
+# Database #
+############
+
+# build a Database with n_chars characters that has been through 'cycles' generate cycles,
+# spread over n_labels input files. About 1% of characters are blacklisted.
+def database(n_chars, cycles=100, n_labels=50, seed=0):
+    rng   = random.Random(seed)
+    chars = hanzi(n_chars)
+    db    = Database()
+    blacklisted = Blacklist()
+
+    db.cycle = cycles
+    per_label = max(1, n_chars // n_labels)
+    for i, c in enumerate(chars):
+        occurred = max(1, int(10000 / (i + 1)))
+        used = rng.randint(0, 5) if rng.random() < 0.8 else 0
+        last = rng.randint(1, cycles) if used else 0
+        db.chars[c] = CharStats(occurred, used, last)
+        db.max_occurrences = max(db.max_occurrences, occurred)
+        db.max_used = max(db.max_used, used)
+
+        label = "lesson{}".format(i // per_label)
+        db.first_seen[c] = label
+        if i % per_label == 0:
+            sha512 = hashlib.sha512(label.encode('utf-8')).digest()
+            db.input_hashes[sha512] = [label, []]
+        db.input_hashes[sha512][1].append(c)
+
+        if rng.random() < 0.01:
+            blacklisted.add(c)
+
+    db.set_blacklist(DEFAULT_BLACKLIST, blacklisted)
+    return db
+
+###############
+# Font CMaps  #
+###############
+
+# write a CMap resource like UniSourceHanSerifCN-UTF32-H with n_chars mappings, about half as
+# begincidchar lines and half as begincidrange lines
+def cmap_file(path, n_chars, seed=0):
+    rng = random.Random(seed)
+    codepoints = [ord(c) for c in hanzi(n_chars)]
+
+    with open(path, 'w') as f:
+        f.write("%!PS-Adobe-3.0 Resource-CMap\n/CIDInit /ProcSet findresource begin\n")
+        cid = 1
+        i = 0
+        while i < len(codepoints):
+            if rng.random() < 0.5:
+                f.write("1 begincidchar\n<{:08x}> {}\nendcidchar\n".format(codepoints[i], cid))
+                cid += 1
+                i += 1
+            else:
+                # only codepoints that are actually contiguous can form a range
+                end = i
+                while end + 1 < len(codepoints) and end - i < 50 and \
+                        codepoints[end + 1] == codepoints[end] + 1:
+                    end += 1
+                f.write("1 begincidrange\n<{:08x}> <{:08x}> {}\nendcidrange\n".format(
+                    codepoints[i], codepoints[end], cid))
+                cid += end - i + 1
+                i = end + 1
+        f.write("endcmap\n")
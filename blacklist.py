@@ -0,0 +1,116 @@
+import zlib
+
+from charhandling import *
+
+# Set of blacklisted characters, stored as a bitset over the hanzi codepoints.
+#
+# Bit i is set if the character with codepoint HANZI_FIRST + i is blacklisted (byte i // 8, bit
+# i % 8, so the layout matches numpy's packbits/unpackbits with bitorder='little'). Only hanzi can
+# be blacklisted, so the range U+3400 to U+2FA1F covers everything in about 22KB, which is
+# compressed when pickled.
+#
+# Single characters can be checked with `c in blacklist` like a set, and mask() checks a whole
+# numpy array of codepoints at once. Blacklists are combined with | (a bitwise OR of the bytes).
+
+HANZI_FIRST = HANZI_RANGES[0][0]
+HANZI_LAST  = HANZI_RANGES[-1][1]
+N_BITS      = HANZI_LAST - HANZI_FIRST + 1
+N_BYTES     = (N_BITS + 7) // 8
+
+class Blacklist:
+    def __init__(self, chars=()):
+        self.bits = bytearray(N_BYTES)
+        self.size = 0
+        for c in chars:
+            self.add(c)
+
+    # the characters of text that are hanzi, found with a vectorized check of every character
+    @classmethod
+    def from_text(cls, text):
+        import numpy as np
+
+        codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        codepoints = np.unique(codepoints[hanzi_mask(codepoints)])
+
+        flags = np.zeros(N_BYTES * 8, dtype=bool)
+        flags[codepoints - HANZI_FIRST] = True
+        return cls.from_bytes(np.packbits(flags, bitorder='little').tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        blacklist = cls()
+        blacklist.bits[:] = data
+        blacklist.size = int.from_bytes(data, 'little').bit_count()
+        return blacklist
+
+    def add(self, c):
+        i = ord(c) - HANZI_FIRST
+        if not 0 <= i < N_BITS:
+            raise ValueError("only hanzi can be blacklisted, not {!r}".format(c))
+        if not self.bits[i >> 3] & (1 << (i & 7)):
+            self.bits[i >> 3] |= 1 << (i & 7)
+            self.size += 1
+
+    def discard(self, c):
+        i = ord(c) - HANZI_FIRST
+        if 0 <= i < N_BITS and self.bits[i >> 3] & (1 << (i & 7)):
+            self.bits[i >> 3] &= ~(1 << (i & 7))
+            self.size -= 1
+
+    def __contains__(self, c):
+        i = ord(c) - HANZI_FIRST
+        return 0 <= i < N_BITS and self.bits[i >> 3] >> (i & 7) & 1 == 1
+
+    def __len__(self):
+        return self.size
+
+    # characters in codepoint order
+    def __iter__(self):
+        for byte_index, byte in enumerate(self.bits):
+            if byte:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield chr(HANZI_FIRST + byte_index * 8 + bit)
+
+    # the whole bitset as one integer, for combining blacklists quickly
+    def as_int(self):
+        return int.from_bytes(self.bits, 'little')
+
+    def __or__(self, other):
+        return Blacklist.from_bytes((self.as_int() | other.as_int()).to_bytes(N_BYTES, 'little'))
+
+    # characters in this blacklist but not in other
+    def __sub__(self, other):
+        return Blacklist.from_bytes((self.as_int() & ~other.as_int()).to_bytes(N_BYTES, 'little'))
+
+    def difference(self, other):
+        return self - other
+
+    def __eq__(self, other):
+        return isinstance(other, Blacklist) and self.bits == other.bits
+
+    def __repr__(self):
+        return "Blacklist({!r})".format("".join(self))
+
+    # boolean numpy array, True where the codepoint at the same index is blacklisted
+    def mask(self, codepoints):
+        import numpy as np
+
+        offsets = np.asarray(codepoints, dtype=np.int64) - HANZI_FIRST
+        inside  = (offsets >= 0) & (offsets < N_BITS)
+        offsets = np.where(inside, offsets, 0)
+        bits    = np.frombuffer(self.bits, dtype=np.uint8)
+        return inside & ((bits[offsets >> 3] >> (offsets & 7)) & 1).astype(bool)
+
+    def __reduce__(self):
+        return (from_compressed, (zlib.compress(bytes(self.bits)),))
+
+def from_compressed(data):
+    return Blacklist.from_bytes(zlib.decompress(data))
+
+# all of the blacklists OR'd together
+def combine(blacklists):
+    bits = 0
+    for blacklist in blacklists:
+        bits |= blacklist.as_int()
+    return Blacklist.from_bytes(bits.to_bytes(N_BYTES, 'little'))
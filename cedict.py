@@ -10,11 +10,13 @@ import re
 # (any slashed definitions are left joined together)
 ENTRY_REGEX = re.compile(r"(\S+)\s+(\S+)\s+\[([^]]+)\]\s+/(.+)/")
 
+DEFAULT_PATH = 'cedict_1_0_ts_utf-8_mdbg.txt'
+
 TRAD_INDEX   = 0
 PINYIN_INDEX = 1
 DEF_INDEX    = 2
 
-def load(path='cedict_1_0_ts_utf-8_mdbg.txt'):
+def load(path=DEFAULT_PATH):
     defs = {}
 
     for line in open(path):
@@ -39,3 +41,7 @@ def load(path='cedict_1_0_ts_utf-8_mdbg.txt'):
             print("Line '{}' failed to match.".format(line))
 
     return defs
+
+# the headwords whose entries differ between two load() results (added, removed or changed)
+def changed_words(old, new):
+    return {word for word in old.keys() | new.keys() if old.get(word) != new.get(word)}
@@ -1,6 +1,6 @@
 import json
 import cedict
-from main import is_hanzi
+from charhandling import is_hanzi
 
 vowels = ['a', 'o', 'e', 'i', 'u', 'ü']
 tones = {
@@ -57,9 +57,20 @@ def add_accents(syl):
     return syl
 
 
-def main():
-    cd = cedict.load()
+# the readings of each character are ranked by how many CEDICT words use them, so that the first
+# is the most common one (e.g. 行 is xíng in far more words than háng). ties keep the order below.
+# returns the pinyin.json table (char -> list of accented readings) for the CEDICT definitions cd.
+def build(cd):
     pinyin = dict()
+    counts = dict() # char -> accented reading -> number of words using it
+
+    def add_reading(char, accented):
+        if char not in pinyin:
+            pinyin[char] = []
+            counts[char] = dict()
+        if accented not in pinyin[char]:
+            pinyin[char].append(accented)
+            counts[char][accented] = 0
 
     # first use any available definitions for single characters
     for word, entries in cd.items():
@@ -67,17 +78,9 @@ def main():
             if len(word) != 1 or not is_hanzi(word[0]):
                 continue # skip multiple-character words or non-hanzi characters
 
-            char = word[0]
-
             # just in case, attempt to split the pinyin string and use only the first syllable
             syllable = data[cedict.PINYIN_INDEX].split()[0]
-
-            if char not in pinyin:
-                pinyin[char] = []
-            
-            accented = add_accents(syllable)
-            if accented not in pinyin[char]:
-                pinyin[char].append(accented)
+            add_reading(word[0], add_accents(syllable))
 
     # sometimes there are characters that have no definition of their own, but occur in other
     # words which do have definitions.
@@ -86,6 +89,7 @@ def main():
     # note that this usually fails horribly when there are non-hanzi characters, because then the
     # syllables do not map directly to characters, so only words consisting wholly of hanzi are
     # used.
+    # every word (including single characters) also counts towards its characters' readings.
 
     for word, entries in cd.items():
         for data in entries:
@@ -93,15 +97,35 @@ def main():
                 continue # skip words with non-hanzi characters in them
 
             syllables = data[cedict.PINYIN_INDEX].split()
+            if len(syllables) != len(word):
+                continue # e.g. erhua written as a separate syllable
 
             for syl, char in enumerate(word):
-                if char not in pinyin:
-                    pinyin[char] = []
                 accented = add_accents(syllables[syl])
-                if accented not in pinyin[char]:
-                    pinyin[char].append(accented)
+                add_reading(char, accented)
+                counts[char][accented] += 1
+
+    for char, readings in pinyin.items():
+        readings.sort(key=lambda accented: counts[char][accented], reverse=True)
+
+    return pinyin
+
+# update the readings of chars in pinyin (a table made by build) for new definitions cd.
+# a character's readings only depend on the words containing it, so only those are counted again.
+def update(pinyin, cd, chars):
+    chars = set(chars)
+    rebuilt = build({word: entries for word, entries in cd.items() if not chars.isdisjoint(word)})
+    for char in chars:
+        if char in rebuilt:
+            pinyin[char] = rebuilt[char]
+        else:
+            pinyin.pop(char, None)
 
-    json.dump(pinyin, open('pinyin.json', 'w'))
+# writes the table to pinyin.json, only as an export for looking at or for other tools: nothing
+# here reads it, the table is the "pinyin" section of the resource bundle (resources.load_pinyin)
+def main():
+    with open('pinyin.json', 'w') as f:
+        json.dump(build(cedict.load()), f)
 
 if __name__ == "__main__":
     main()
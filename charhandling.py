@@ -48,3 +48,19 @@ def is_hanzi(char):
     # no more blocks we care about above this point, return False
     return False
 
+# the same blocks as is_hanzi, as inclusive (first, last) codepoint ranges
+HANZI_RANGES = [
+    (0x3400,  0x4DBF),  # CJK Unified Ideographs Extension A
+    (0x4E00,  0x9FFF),  # CJK Unified Ideographs
+    (0xF900,  0xFAFF),  # CJK Compatibility Ideographs
+    (0x20000, 0x2FA1F), # CJK Unified Ideographs B through F and Supplement
+]
+
+# vectorized is_hanzi: takes a numpy array of codepoints, returns a boolean array
+def hanzi_mask(codepoints):
+    import numpy as np
+
+    mask = np.zeros(len(codepoints), dtype=bool)
+    for first, last in HANZI_RANGES:
+        mask |= (codepoints >= first) & (codepoints <= last)
+    return mask
@@ -0,0 +1,118 @@
+import radicals
+from radicals import PARENT_INDEX, DESCENDANT_LEFT_INDEX, DESCENDANT_RIGHT_INDEX, NUM_STROKES_INDEX
+
+# Inverted indexes of the radicals data, for finding characters by what they're made of:
+#
+#   main.py search [components] [strokes | first-last] [--type=⿰] [--all]
+#   e.g. main.py search 氵 8-10      characters in the database containing 氵 with 8 to 10 strokes
+#
+# radicals.py links each character to its parents and descendants, which answers "what's near
+# this character", but finding every character containing a component means walking the whole
+# graph below it. So when the resources are built, the radicals data is turned into:
+#   components:  component -> (start, end) of the characters containing it (directly or through
+#                other components, e.g. 河 contains 可 and so 口) in component_chars
+#   component_chars:  codepoints, sorted within each component's range
+#   by_strokes:  codepoints of every character, sorted by stroke count then codepoint, with
+#                stroke_offsets[n] the index of the first with n strokes, so a range of stroke
+#                counts is one slice
+#   compositions: composition type (⿰, ⿱, ...) -> sorted codepoints
+# all numpy arrays, so each part of a query is a slice and they're combined with intersections.
+#
+# It's the "search" section of the resource bundle (resources.load_search_index).
+
+class SearchIndex:
+    @classmethod
+    def from_radicals(cls, rads):
+        import numpy as np
+
+        index = cls()
+
+        # characters containing each component, built bottom up so each is only worked out once
+        contained = dict()
+        def containing(c):
+            if c not in contained:
+                contained[c] = set() # also stops cycles in broken data
+                found = set()
+                for child in rads[c][DESCENDANT_LEFT_INDEX] | rads[c][DESCENDANT_RIGHT_INDEX]:
+                    if len(child) == 1:
+                        found.add(ord(child))
+                    found |= containing(child)
+                contained[c] = found
+            return contained[c]
+
+        index.components = dict()
+        chunks = []
+        start = 0
+        for c in rads:
+            chars = containing(c)
+            if chars:
+                chunks.append(np.sort(np.fromiter(chars, np.uint32, len(chars))))
+                index.components[c] = (start, start + len(chars))
+                start += len(chars)
+        index.component_chars = np.concatenate(chunks) if chunks else np.zeros(0, np.uint32)
+
+        chars = [c for c in rads if len(c) == 1] # not placeholder components like 人*
+        strokes = np.fromiter((rads[c][NUM_STROKES_INDEX] for c in chars), np.int64, len(chars))
+        codepoints = np.fromiter(map(ord, chars), np.uint32, len(chars))
+        order = np.lexsort((codepoints, strokes))
+        index.by_strokes = codepoints[order]
+        index.stroke_offsets = np.searchsorted(strokes[order],
+                                               np.arange(strokes.max(initial=0) + 2))
+
+        index.compositions = dict()
+        for c in chars:
+            parents = rads[c][PARENT_INDEX]
+            if parents:
+                composition_type = parents[radicals.COMPOSITION_TYPE_INDEX]
+                index.compositions.setdefault(composition_type, []).append(ord(c))
+        index.compositions = {t: np.array(sorted(cps), dtype=np.uint32)
+                              for t, cps in index.compositions.items()}
+        return index
+
+    def containing(self, component):
+        import numpy as np
+
+        if component not in self.components:
+            return np.zeros(0, np.uint32)
+        start, end = self.components[component]
+        return self.component_chars[start:end]
+
+    # characters with first to last strokes (inclusive), sorted
+    def with_strokes(self, first, last):
+        import numpy as np
+
+        n = len(self.stroke_offsets) - 1
+        first, last = max(first, 0), min(last, n - 1)
+        if first > last:
+            return np.zeros(0, np.uint32)
+        return np.sort(self.by_strokes[self.stroke_offsets[first]:self.stroke_offsets[last + 1]])
+
+    def with_composition(self, composition_type):
+        import numpy as np
+        return self.compositions.get(composition_type, np.zeros(0, np.uint32))
+
+    # the characters matching every condition given (components: all of them; strokes: a
+    # (first, last) range; composition_type), and in chars (an array of codepoints) if given.
+    # Returns codepoints sorted by stroke count, then codepoint.
+    def search(self, components=(), strokes=None, composition_type=None, chars=None):
+        import numpy as np
+
+        sets = [self.containing(c) for c in components]
+        if strokes is not None:
+            sets.append(self.with_strokes(*strokes))
+        if composition_type is not None:
+            sets.append(self.with_composition(composition_type))
+        if chars is not None:
+            sets.append(np.unique(np.asarray(chars, dtype=np.uint32)))
+        if not sets:
+            sets.append(np.sort(self.by_strokes))
+
+        # smallest first, so every intersection is at most that big
+        sets.sort(key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            result = np.intersect1d(result, other, assume_unique=True)
+
+        # back into stroke order: by_strokes positions of the results
+        in_result = np.isin(self.by_strokes, result, assume_unique=True)
+        return self.by_strokes[in_result]
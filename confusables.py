@@ -0,0 +1,139 @@
+import heapq
+import collections
+
+import radicals
+import phonetic
+from database import TIMES_OCCURRED
+
+# Index of confusable characters: for each character in the database, the characters (also in
+# the database) that look similar, sound similar, or both. Used for distractor drills, see the
+# genconf command.
+#
+#   main.py confusables [top_k]   (re)builds confusables.npz
+#   main.py genconf [n_chars]     generates characters, each with its confusables
+#
+# Each candidate gets a score from 0 to 1 for each kind of similarity:
+#   visual:   from the radicals.characters_within distance d, which starts at
+#             COST_DIFFERENT_RADICAL: (MAX_VISUAL_DISTANCE - d) / (MAX_VISUAL_DISTANCE - 1)
+#   phonetic: from the distance between the weighted phonetic coordinates of the closest
+#             readings: 1 - distance / MAX_PHONETIC_DISTANCE (so the same reading scores 1)
+# and the confusables of a character are the TOP_K with the highest
+#   VISUAL_WEIGHT * visual + PHONETIC_WEIGHT * phonetic
+# with ties going to the more frequent character, as they make better distractors.
+#
+# Many characters share a reading, so phonetic distances are worked out between the distinct
+# syllables rather than between every pair of characters.
+#
+# The index is stored as numpy arrays of codepoints, sorted so a whole list of characters can be
+# looked up at once with searchsorted:
+#   chars        uint32[n]           codepoint of each indexed character, sorted
+#   confusables  uint32[n, top_k]    codepoints of its confusables, best first, 0 for none
+#   scores       float16[n, top_k]   their scores
+
+INDEX_PATH = "confusables.npz"
+
+TOP_K = 8
+
+MAX_VISUAL_DISTANCE   = 2.5
+MAX_PHONETIC_DISTANCE = 0.6 # a different tone, or a neighbouring initial or final
+VISUAL_WEIGHT         = 1
+PHONETIC_WEIGHT       = 1
+
+# the readings of a character as weighted coordinates (pinyin is pinyin.json format)
+def reading_coords(pinyin, c):
+    coords = []
+    for syllable in pinyin.get(c, ()):
+        coord = phonetic.syllable2coord(phonetic.accented2numbered(syllable))
+        if coord[0] >= 0: # -1 if the final wasn't recognised
+            coords.append(tuple(phonetic.weigh_coord(coord)))
+    return coords
+
+# the distinct readings of chars, for scoring phonetic similarity:
+#   readings:   list of the chars with each reading
+#   similarity: [reading, reading] array of phonetic similarity scores
+#   char_readings: char -> list of the indexes of its readings
+def reading_table(chars, pinyin):
+    import numpy as np
+
+    index = dict() # coord -> reading index
+    readings = []
+    char_readings = dict()
+    for c in chars:
+        char_readings[c] = []
+        for coord in reading_coords(pinyin, c):
+            if coord not in index:
+                index[coord] = len(readings)
+                readings.append([])
+            readings[index[coord]].append(c)
+            char_readings[c].append(index[coord])
+
+    # distances between every pair of distinct readings at once
+    coords = np.array(list(index), dtype=float).reshape(-1, 3)
+    distances = np.sqrt(((coords[:, None, :] - coords[None, :, :]) ** 2).sum(axis=2))
+    similarity = np.clip(1 - distances / MAX_PHONETIC_DISTANCE, 0, None)
+    return readings, similarity, char_readings
+
+# list of (score, confusable) of every character of chars that looks or sounds like c
+def score_confusables(c, chars, rads, readings, similarity, char_readings):
+    candidates = collections.defaultdict(lambda: [0, 0]) # char -> [visual, phonetic]
+
+    if c in rads:
+        for other, distance in radicals.characters_within(rads, c, MAX_VISUAL_DISTANCE):
+            if other in chars:
+                visual = (MAX_VISUAL_DISTANCE - distance) / (MAX_VISUAL_DISTANCE - 1)
+                candidates[other][0] = max(candidates[other][0], visual)
+
+    for i in char_readings[c]:
+        for j in similarity[i].nonzero()[0]:
+            for other in readings[j]:
+                if other != c and candidates[other][1] < similarity[i, j]:
+                    candidates[other][1] = similarity[i, j]
+
+    return [(VISUAL_WEIGHT * v + PHONETIC_WEIGHT * p, other)
+            for other, (v, p) in candidates.items()]
+
+# build the index for the non-blacklisted characters of the database
+def build(db, rads, pinyin, top_k=TOP_K):
+    import numpy as np
+
+    chars = sorted(c for c in db.chars if c not in db.blacklist)
+    char_set = set(chars)
+    readings, similarity, char_readings = reading_table(chars, pinyin)
+
+    confusables = np.zeros((len(chars), top_k), dtype=np.uint32)
+    confusable_scores = np.zeros((len(chars), top_k), dtype=np.float16)
+    for row, c in enumerate(chars):
+        scores = score_confusables(c, char_set, rads, readings, similarity, char_readings)
+        best = heapq.nlargest(top_k, scores, key=lambda v: (v[0], db.chars[v[1]][TIMES_OCCURRED]))
+        for column, (score, other) in enumerate(best):
+            confusables[row, column] = ord(other)
+            confusable_scores[row, column] = score
+
+    return {"chars":       np.array([ord(c) for c in chars], dtype=np.uint32),
+            "confusables": confusables,
+            "scores":      confusable_scores}
+
+def save(index, path=INDEX_PATH):
+    import numpy as np
+    np.savez_compressed(path, **index)
+
+def load(path=INDEX_PATH):
+    import numpy as np
+    with np.load(path) as f:
+        return {name: f[name] for name in f.files}
+
+# the confusables of each character, as a list of strings (empty for characters not indexed).
+# all of the characters are looked up with one searchsorted.
+def lookup(index, chars):
+    import numpy as np
+
+    indexed = index["chars"]
+    if not len(indexed):
+        return [""] * len(chars)
+
+    codepoints = np.array([ord(c) for c in chars], dtype=np.uint32)
+    rows  = np.minimum(np.searchsorted(indexed, codepoints), len(indexed) - 1)
+    found = indexed[rows] == codepoints
+
+    return ["".join(chr(cp) for cp in row if cp) if is_found else ""
+            for row, is_found in zip(index["confusables"][rows], found)]
@@ -1,10 +1,18 @@
 import os
-import math
-import pickle, json
+import pickle
 import hashlib
-import numpy as np
+import shutil
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # not on Windows; the database isn't locked there
+
+# numpy is imported by the functions that use it, as importing it takes longer than most commands
 
 from charhandling import *
+import blacklist
 
 DB_PATH = "db.pickle"
 
@@ -12,7 +20,7 @@ DB_PATH = "db.pickle"
 # "cycle":
 #   Integer representing how many times the generate feature has been used.
 # "chars":
-#   Dict of CJK characters mapped to a tuple (as a list) of integers:
+#   Dict of CJK characters mapped to a CharStats record of integers:
 #       [times_occurred, times_used, last_used]
 #   where:
 #       times_occurred is the number of times the character appears in the input files.
@@ -20,7 +28,8 @@ DB_PATH = "db.pickle"
 #       last_used      is the cycle value when the character was last selected
 #   These are used to score characters, so that the most frequently used characters that haven't
 #   been selected recently are most likely to be selected.
-#   Note that it's a list instead of a tuple so that we can update part of it more conveniently.
+#   CharStats can be indexed and unpacked like the list this used to be, e.g. d[TIMES_USED].
+#   In the pickle file the records are stored as columns instead (see Database.__getstate__).
 # "first_seen":
 #   Dict of characters to labels of the document where this character was seen for the first time.
 # "max_used":
@@ -31,13 +40,89 @@ DB_PATH = "db.pickle"
 #   Dict of of SHA512 hashes of input files to a list containing the file's label and a list
 #   of new characters introduced in this file.
 #   Prevents files from being loaded more than once and helps keep track of introduced characters.
+# "readings":
+#   Dict of heteronyms to a dict of how many times each of their readings occurred in the input
+#   files, from files added with a readings.Segmenter (see readings.py).
+# "blacklists":
+#   Dict of names to blacklist.Blacklist sets of characters which should never be generated
+#   (because they are too easy or whatever). There can be several, e.g. one per class or level;
+#   "default" is the one loaded from blacklist.txt.
 # "blacklist":
-#   Characters which should never be generated (because they are too easy or whatever)
+#   All of the blacklists combined, which is what generation checks against. It isn't saved, as
+#   it's recombined from blacklists when loading.
+# "scheduler":
+#   scheduler.Scheduler holding the due cycle of each character for the schedule feature, or None
+#   if schedule has never been used. It's created from the times_used/last_used columns.
+# "_freq_index":
+#   freqindex.FrequencyIndex of the characters by times_occurred, or None if it hasn't been needed
+#   yet. It isn't saved, see Database.frequency_index.
+# "_label_index":
+#   labelindex.LabelIndex of the characters and input files of each label, or None if it hasn't
+#   been needed yet. Also not saved, see Database.label_index.
+
+DEFAULT_BLACKLIST = "default"
 
 TIMES_OCCURRED = 0
 TIMES_USED     = 1
 LAST_USED      = 2
 
+# Stats for one character. This used to be a 3 element list, but a list has a lot of overhead
+# for so little data; a record with __slots__ takes 25-29% less memory per character.
+class CharStats:
+    # in the same order as the *_INDEX constants above
+    __slots__ = ("times_occurred", "times_used", "last_used")
+
+    def __init__(self, times_occurred=0, times_used=0, last_used=0):
+        self.times_occurred = times_occurred
+        self.times_used     = times_used
+        self.last_used      = last_used
+
+    def __getitem__(self, index):
+        return getattr(self, CharStats.__slots__[index])
+
+    def __setitem__(self, index, value):
+        setattr(self, CharStats.__slots__[index], value)
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        yield self.times_occurred
+        yield self.times_used
+        yield self.last_used
+
+    # equal to lists and tuples with the same values, like the old lists
+    def __eq__(self, other):
+        if not isinstance(other, (CharStats, list, tuple)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __reduce__(self):
+        return (CharStats, tuple(self))
+
+# weights used by score_chars; see simulate.py for comparing other values
+OCCUR_WEIGHT = 2  # weight of how often a character occurs relative to how rarely it was used
+UNUSED_BOOST = 16 # since_last multiplier for characters that have never been used
+
+# produce a score for each character indicating how likely it should be to be selected.
+# occurred, used and last are numpy arrays of each character's stats; returns an array of scores.
+def score_chars(occurred, used, last, cycle, max_occurrences, max_used,
+                occur_weight=OCCUR_WEIGHT, unused_boost=UNUSED_BOOST):
+    import numpy as np
+
+    occur_score = occurred / max_occurrences
+    used_score  = (max_used - used) / max_used
+    since_last  = np.log2((cycle - last) / cycle + 1)
+
+    # hack: if the character hasn't been used at all, drastically increase
+    # the since_last multiplier to try to ensure unused characters come first.
+    since_last = np.where(used == 0, since_last * unused_boost, since_last)
+
+    return (occur_score * occur_weight + used_score) * since_last
+
 class Database:
     def __init__(self):
         self.cycle           = 0
@@ -46,14 +131,51 @@ class Database:
         self.max_used        = 1
         self.max_occurrences = 0
         self.input_hashes    = dict()
-        self.blacklist       = set()
+        self.readings        = dict()
+        self.blacklists      = dict()
+        self.blacklist       = blacklist.Blacklist()
+        self.scheduler       = None
+        self._freq_index     = None
+        self._label_index    = None
+
+    # chars is pickled as columns: a string of the characters (every key is a single character)
+    # followed by a list of each field, which is much smaller and quicker to load than a
+    # record per character.
+    # attributes starting with _ are only for this run, e.g. _base (see load_db), and aren't saved
+    def __getstate__(self):
+        state = {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+        del state["blacklist"]  # recombined when loading
+        state["chars"] = (
+            "".join(self.chars),
+            [d.times_occurred for d in self.chars.values()],
+            [d.times_used     for d in self.chars.values()],
+            [d.last_used      for d in self.chars.values()])
+        return state
+
+    # databases pickled by older versions lack newer attributes, so start from the defaults.
+    # they also store chars as a dict of lists rather than columns, and have a single blacklist
+    # set rather than named blacklists.
+    def __setstate__(self, state):
+        self.__init__()
+        self.__dict__.update(state)
+        if isinstance(self.chars, tuple):
+            keys, occurred, used, last = self.chars
+            self.chars = dict(zip(keys, map(CharStats, occurred, used, last)))
+        else:
+            self.chars = {c: CharStats(*d) for c, d in self.chars.items()}
+
+        if isinstance(self.blacklist, set):
+            self.blacklists = {DEFAULT_BLACKLIST: blacklist.Blacklist(self.blacklist)}
+        self.blacklist = blacklist.combine(self.blacklists.values())
 
     #####################
     # Adding characters #
     #####################
 
-    # adds unique characters from a file to the db, if the file is not in input_hashes
-    def add_text(db, path, label, override_hashing = False):
+    # adds unique characters from a file to the db, if the file is not in input_hashes.
+    # if it is, the user is asked whether to change its label, unless relabel is True or False.
+    # if segmenter (a readings.Segmenter) is given, the readings of its heteronyms are counted too.
+    def add_text(db, path, label, override_hashing = False, relabel = None, segmenter = None):
         # read the file's bytes into memory
         try:
             with open(path, 'rb') as f: # binary mode, do not convert to text yet
@@ -67,17 +189,23 @@ class Database:
             sha512 = hashlib.sha512(data).digest()
             if sha512 in db.input_hashes:
                 print("File already in database! Label: '{}'".format(db.input_hashes[sha512][0]))
-                choice = input("Change label to '{}' (Y/N)?: ".format(label))
-                if choice.lower().startswith('y'):
+                if relabel is None:
+                    relabel = input("Change label to '{}' (Y/N)?: ".format(label)).lower().startswith('y')
+                if relabel:
+                    old_label, chars = db.input_hashes[sha512]
                     db.input_hashes[sha512][0] = label
-                    for char in db.input_hashes[sha512][1]:
+                    for char in chars:
                         db.first_seen[char] = label
+                    if db._label_index is not None:
+                        db._label_index.relabel(sha512, chars, old_label, label)
                     print("Changed.")
                     return True
                 print("Unchanged.")
                 return False
             # we haven't added it yet, so store its hash now
             db.input_hashes[sha512] = [label]
+            if db._label_index is not None:
+                db._label_index.add_hash(sha512, label)
 
         # decode the file as utf8
         try:
@@ -97,14 +225,26 @@ class Database:
             if is_hanzi(c):
                 if c not in db.chars:
                     # first time we've seen this character
-                    db.chars[c] = [1, 0, 0] # seen once, never selected, considered last used on cycle 0
+                    db.chars[c] = CharStats(1, 0, 0) # seen once, never selected, considered last used on cycle 0
                     db.first_seen[c] = label
+                    if db._label_index is not None:
+                        db._label_index.add_char(c, label)
                     new_characters.append(c)
+                    if db.scheduler is not None:
+                        db.scheduler.add(db, c)
+                    if db._freq_index is not None and c not in db.blacklist:
+                        db._freq_index.add(c, 1)
                 else:
-                    occ = db.chars[c][TIMES_OCCURRED] + 1 # seen once more
-                    db.chars[c][TIMES_OCCURRED] = occ
+                    d = db.chars[c]
+                    occ = d.times_occurred + 1 # seen once more
+                    d.times_occurred = occ
                     if occ > db.max_occurrences:
                         db.max_occurrences = occ
+                    if db._freq_index is not None and c not in db.blacklist:
+                        db._freq_index.increment(c, occ)
+
+        if segmenter is not None:
+            segmenter.count(text, db.readings)
 
         if not override_hashing: # do this check to prevent possible KeyError
             db.input_hashes[sha512].append(new_characters)
@@ -117,97 +257,256 @@ class Database:
 
     # not very efficient but even if all possible Chinese characters are in the database,
     # generation shouldn't take too long on human timescales.
-    def generate(db, n_chars):
+    #
+    # rng is anything with a numpy-style choice() method, e.g. np.random.default_rng(seed) for
+    # reproducible output. If labels is given, only characters first seen in files with those
+    # labels are selected. The remaining arguments are passed to score_chars.
+    def generate(db, n_chars, rng=None, labels=None,
+                 occur_weight=OCCUR_WEIGHT, unused_boost=UNUSED_BOOST):
+        import numpy as np
+
         db.cycle += 1
 
         if db.max_occurrences < 1:
             raise Exception("max_occurrences is zero, meaning there are no characters in the db!")
 
+        # the stats of every character, then only those of characters that can be selected
+        keys  = "".join(db.chars)
+        stats = np.array([(d.times_occurred, d.times_used, d.last_used)
+                          for d in db.chars.values()], dtype=float).reshape(-1, 3)
+        codepoints = np.frombuffer(keys.encode('utf-32-le'), dtype=np.uint32)
+        allowed = ~db.blacklist.mask(codepoints)
+        if labels:
+            allowed &= db.label_index().candidates(labels).mask(codepoints)
+        charlist = np.flatnonzero(allowed) # index of each selectable char
+        if labels:
+            n_chars = min(n_chars, len(charlist)) # a few lessons may not have enough characters
+        stats = stats[charlist]
+
         # produce a score for each character indicating how likely it should be to be selected
-        scores = []
-        charlist = [] # keep a list of each character where the index is the same as the index for its score
-        for c, d in db.chars.items():
-            if c in db.blacklist:
-                continue # skip blacklisted characters
-
-            occurred, used, last = d
-            
-            occur_score = occurred / db.max_occurrences
-            used_score  = (db.max_used - used) / db.max_used
-            since_last  = (db.cycle - last) / db.cycle
-            if since_last > 0:
-                since_last = math.log2(since_last + 1)
-
-            # hack: if the character hasn't been used at all, drastically increase
-            # the since_last multiplier to try to ensure unused characters come first.
-            if used == 0:
-                since_last *= 16
-
-            scores.append((occur_score * 2 + used_score) * since_last)
-            charlist.append(c)
-
-        # convert scores array to np.array then normalize it so the probabilities sum to 1
-        scores = np.array(scores)
+        scores = score_chars(
+            stats[:, TIMES_OCCURRED], stats[:, TIMES_USED], stats[:, LAST_USED],
+            db.cycle, db.max_occurrences, db.max_used,
+            occur_weight, unused_boost)
+
+        # normalize the scores so the probabilities sum to 1
         scores /= scores.sum(0)
 
         # select n_chars randomly, weighted by the score.
         # the selection is made without replacement, i.e., there will not be duplicates
-        indices = list(np.random.choice(len(charlist), n_chars, False, scores))
+        if rng is None:
+            rng = np.random
+        indices = list(rng.choice(len(charlist), n_chars, False, scores))
 
         output = []
         for index in indices:
-            c = charlist[index]
+            c = keys[charlist[index]]
             output.append(c)
+            db.mark_used(c)
+
+        return output
+
+    # select the n_chars characters that are due soonest according to the scheduler.
+    # unlike generate this doesn't look at every character, see scheduler.py
+    def schedule(db, n_chars):
+        import scheduler
 
-            # update character usage info
-            occur, used, _ = db.chars[c]
-            used += 1
-            if used > db.max_used:
-                db.max_used = used
-            db.chars[c] = [occur, used, db.cycle]
+        if db.scheduler is None:
+            # first use; initialise due dates from the existing usage info
+            db.scheduler = scheduler.Scheduler.from_database(db)
+
+        db.cycle += 1
+
+        output = db.scheduler.pop(db, n_chars)
+        for c in output:
+            db.mark_used(c)
 
         return output
 
+    # update character usage info after it was selected on the current cycle
+    def mark_used(db, c):
+        d = db.chars[c]
+        d.times_used += 1
+        d.last_used   = db.cycle
+        if d.times_used > db.max_used:
+            db.max_used = d.times_used
+
+        if db.scheduler is not None:
+            db.scheduler.selected(db, c)
+
     #############
     # Blacklist #
     #############
 
-    def update_blacklist(db, path="blacklist.txt"):
+    # replace the blacklist called name with the hanzi in the file at path
+    def update_blacklist(db, path="blacklist.txt", name=None):
         # the blacklist file is just a regular text file; all the hanzi are extracted from it
         # and other characters are ignored. So it can contain comments in English without causing
         # any issues.
-        new_blacklist = set(filter(is_hanzi, set(open(path, 'r').read())))
-        
-        print("Added:", list(new_blacklist.difference(db.blacklist)))
-        print("Removed:", list(db.blacklist.difference(new_blacklist)))
-        
-        db.blacklist = new_blacklist
+        with open(path, 'r') as f:
+            new_blacklist = blacklist.Blacklist.from_text(f.read())
+
+        added, removed = db.set_blacklist(name or DEFAULT_BLACKLIST, new_blacklist)
+        print("Added:", list(added))
+        print("Removed:", list(removed))
 
         return True
 
+    # set (or with an empty blacklist, remove) a named blacklist. Returns the characters that are
+    # newly blacklisted and those no longer blacklisted, as Blacklists.
+    def set_blacklist(db, name, new_blacklist):
+        if len(new_blacklist):
+            db.blacklists[name] = new_blacklist
+        else:
+            db.blacklists.pop(name, None)
+
+        old_combined = db.blacklist
+        db.blacklist = blacklist.combine(db.blacklists.values())
+        added   = db.blacklist - old_combined
+        removed = old_combined - db.blacklist
+
+        if db.scheduler is not None:
+            # characters added to the blacklist are dropped lazily by the scheduler, but
+            # removed ones need to be scheduled again
+            for c in removed:
+                if c in db.chars:
+                    db.scheduler.add(db, c)
+
+        if db._freq_index is not None:
+            for c in added:
+                if c in db.chars:
+                    db._freq_index.remove(c, db.chars[c].times_occurred)
+            for c in removed:
+                if c in db.chars:
+                    db._freq_index.add(c, db.chars[c].times_occurred)
+
+        return added, removed
+
+    ###################
+    # Frequency index #
+    ###################
+
+    # the characters indexed by times_occurred (see freqindex.py). It's built from the chars
+    # the first time it's needed, then kept up to date as text is added.
+    def frequency_index(db):
+        import freqindex
+
+        if db._freq_index is None:
+            db._freq_index = freqindex.FrequencyIndex.from_database(db)
+        return db._freq_index
+
+    ###############
+    # Label index #
+    ###############
+
+    # the characters and files of each label (see labelindex.py). Like the frequency index, it's
+    # built the first time it's needed and then kept up to date by add_text.
+    def label_index(db):
+        import labelindex
+
+        if db._label_index is None:
+            db._label_index = labelindex.LabelIndex.from_database(db)
+        return db._label_index
+
 #####################################
 # Database load and save operations #
 #####################################
 
+# Several runs can use the database at once (e.g. cron jobs for adding handouts and generating
+# sheets), so:
+#   - loading and saving take an advisory lock on path + ".lock" (shared for loading, exclusive
+#     for saving), where fcntl is available.
+#   - the database is written to a temporary file which is synced and then renamed over the old
+#     one, so there's always a complete database file, even after a crash.
+#   - the bytes that were loaded are kept (as db._base), and if the file was changed by another
+#     run while this one was working, the changes of both are merged (see merge) before saving.
+#     If they conflict nothing is saved.
+
+LOCK_SUFFIX = ".lock"
+
+@contextlib.contextmanager
+def locked(path, shared=False):
+    if fcntl is None:
+        yield # no locking on this platform
+        return
+    with open(path + LOCK_SUFFIX, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# the contents of a file, or None if it doesn't exist
+def read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
 # note: database uses pickle, which is not very secure. Make sure the database file can be trusted.
 def load_db(path=DB_PATH):
-    if not os.path.isfile(path):
-        print("Database file does not exist, using empty database.")
-        return Database()
     try:
-        f = open(path, 'rb')
-        return pickle.load(f)
+        with locked(path, shared=True):
+            data = read_file(path)
+        if data is None:
+            print("Database file does not exist, using empty database.")
+            db = Database()
+        else:
+            db = pickle.loads(data)
     except Exception as e:
         print("Failed to load database:", e)
         return False
-
+    db._base = data
+    return db
+
+# if the file was changed by another run, the changes are merged into a copy of db, and db is only
+# updated if they didn't conflict. On a conflict nothing is saved and db is left as it was, and
+# MergeConflict is raised if raise_conflicts is True (so long running commands can decide what to
+# do), otherwise it's printed like other errors.
+def save_db(db, path=DB_PATH, raise_conflicts=False):
+    try:
+        with locked(path):
+            current = read_file(path)
+            base = getattr(db, "_base", None)
+            result = db
+            if current != base:
+                print("Database was changed by another run, merging")
+                result = merged(pickle.loads(base) if base else Database(), db,
+                                pickle.loads(current))
+            data = pickle.dumps(result)
+            if not save_file(path, data):
+                return False
+    except MergeConflict as e:
+        if raise_conflicts:
+            raise
+        print("Failed to save database:", e)
+        return False
+    except OSError as e:
+        print("Failed to save database:", e)
+        return False
+    if result is not db:
+        db.__dict__.update(result.__dict__)
+    db._base = data
+    return True
+
+# atomically replace the file at path with data, keeping the previous version in the "old/"
+# directory marked with its modification time. Returns False (after printing the error) on
+# failure. Callers should hold the lock for path.
 # note: this function performs unsafe path concatenation. So don't feed it a dodgy path.
-def save_db(db, path=DB_PATH):
+def save_file(path, data):
     old_dir_path = "old/"
+    tmp_path = path + ".tmp"
 
     try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
         if os.path.isfile(path):
-            # file exists, so move it to the "old/" directory marked with its modification time
+            # file exists, so link it into the "old/" directory marked with its modification time.
+            # it stays in place until the new file replaces it.
             if not os.path.isdir(old_dir_path):
                 # if old directory doesn't exist, create it
                 os.mkdir(old_dir_path)
@@ -215,19 +514,130 @@ def save_db(db, path=DB_PATH):
             # get file stats
             stat = os.stat(path)
 
-            os.rename(path, old_dir_path + path + '.' + str(int(stat.st_mtime)))
-        f = open(path, 'xb')
-        pickle.dump(db, f)
-        return True        
+            # paths in subdirectories (e.g. classes/) are flattened into the name
+            old_path = old_dir_path + path.replace(os.sep, '_') + '.' + str(int(stat.st_mtime))
+            if not os.path.exists(old_path):
+                try:
+                    os.link(path, old_path)
+                except OSError:
+                    shutil.copy2(path, old_path) # e.g. a filesystem without hard links
+
+        os.replace(tmp_path, path)
+
+        # make the rename itself durable
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        return True
     except Exception as e:
         print("Failed to save database:", e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return False
 
-def load_pinyin(path="pinyin.json"):
-    try:
-        f = open(path, 'rb')
-        return json.load(f)
-    except Exception as e:
-        print("Failed to load cedict JSON:", e)
-        return False
-
+###########
+# Merging #
+###########
+
+class MergeConflict(Exception):
+    pass
+
+# the value to use for something that was base, and is now ours and theirs in two concurrent runs
+def merge_value(name, base, ours, theirs):
+    if ours == theirs or theirs == base:
+        return ours
+    if ours == base:
+        return theirs
+    raise MergeConflict("{} was changed by both runs".format(name))
+
+MISSING = object()
+
+# merge_value for every key of dicts, updating ours
+def merge_dict(name, base, ours, theirs):
+    for key in set(ours) | set(theirs):
+        value = merge_value("{}[{!r}]".format(name, key), base.get(key, MISSING),
+                            ours.get(key, MISSING), theirs.get(key, MISSING))
+        if value is MISSING:
+            ours.pop(key, None)
+        else:
+            ours[key] = value
+
+# merge the changes made by another run (from base to theirs) into ours, which was also loaded
+# from base. Raises MergeConflict if both changed the same thing, which can leave ours half
+# merged, so the save functions use merged() instead.
+#
+# times_occurred and readings are counts, so both runs' additions are kept (e.g. two different
+# handouts added at once). If both handouts introduced the same character, the run that saved
+# first (theirs) keeps it: its label stays in first_seen, and it's taken out of the new characters
+# of our file. Everything else can only be changed by one of the runs; in particular
+# generating increments the cycle, so two runs that both generated always conflict.
+def merge(base, ours, theirs):
+    # both runs generating would make the same cycle number, but that's still a conflict
+    if ours.cycle != base.cycle and theirs.cycle != base.cycle:
+        raise MergeConflict("both runs generated characters")
+    ours.cycle = merge_value("cycle", base.cycle, ours.cycle, theirs.cycle)
+
+    both_new = {c for c in ours.first_seen.keys() & theirs.first_seen.keys()
+                if c not in base.first_seen}
+    if both_new:
+        for c in both_new:
+            ours.first_seen[c] = theirs.first_seen[c]
+        for h, entry in ours.input_hashes.items():
+            if h not in base.input_hashes and len(entry) > 1:
+                entry[1] = [c for c in entry[1] if c not in both_new]
+
+    for h in set(ours.input_hashes) & set(theirs.input_hashes):
+        if h not in base.input_hashes:
+            raise MergeConflict("the same file was added by both runs")
+    merge_dict("input_hashes", base.input_hashes, ours.input_hashes, theirs.input_hashes)
+    merge_dict("first_seen", base.first_seen, ours.first_seen, theirs.first_seen)
+    merge_dict("blacklists", base.blacklists, ours.blacklists, theirs.blacklists)
+    ours.blacklist = blacklist.combine(ours.blacklists.values())
+
+    unused = CharStats()
+    for c, t in theirs.chars.items():
+        b = base.chars.get(c, unused)
+        o = ours.chars.get(c)
+        if o is None:
+            ours.chars[c] = t
+            continue
+        o.times_occurred += t.times_occurred - b.times_occurred
+        o.times_used = merge_value(c + " times_used", b.times_used, o.times_used, t.times_used)
+        o.last_used  = merge_value(c + " last_used",  b.last_used,  o.last_used,  t.last_used)
+
+    for c, t in theirs.readings.items():
+        b = base.readings.get(c, {})
+        o = ours.readings.setdefault(c, dict())
+        for reading, count in t.items():
+            o[reading] = o.get(reading, 0) + count - b.get(reading, 0)
+
+    ours.max_used = max(ours.max_used, theirs.max_used)
+    ours.max_occurrences = max((d.times_occurred for d in ours.chars.values()), default=0)
+
+    # the scheduler can be rebuilt from the usage columns, so if both runs changed it, it's rebuilt
+    # from the merged columns. otherwise the changed one is used, plus characters the other added.
+    ours_changed   = pickle.dumps(ours.scheduler)   != pickle.dumps(base.scheduler)
+    theirs_changed = pickle.dumps(theirs.scheduler) != pickle.dumps(base.scheduler)
+    if theirs_changed and not ours_changed:
+        ours.scheduler = theirs.scheduler
+    elif theirs_changed and ours_changed and ours.scheduler is not None:
+        sched = ours.scheduler
+        ours.scheduler = type(sched).from_database(ours, first_interval=sched.first_interval,
+                                                   second_interval=sched.second_interval,
+                                                   ease=sched.ease)
+    if ours.scheduler is not None:
+        for c in ours.chars:
+            if c not in ours.scheduler:
+                ours.scheduler.add(ours, c)
+
+    ours._freq_index  = None # rebuilt when needed
+    ours._label_index = None
+
+# a copy of ours with the changes from base to theirs merged in, leaving ours unchanged
+def merged(base, ours, theirs):
+    result = pickle.loads(pickle.dumps(ours))
+    merge(base, result, theirs)
+    return result
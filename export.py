@@ -0,0 +1,133 @@
+import os
+import csv
+import zipfile
+
+import sitebuild
+from database import TIMES_OCCURRED, TIMES_USED, LAST_USED
+
+# Export of the database as columnar files, for analysing usage and coverage elsewhere (pandas,
+# a spreadsheet, ...) without unpickling the live database.
+#
+#   main.py export [out_dir] [--format=csv|npz]     (both formats by default)
+#
+# CSV, one file per table:
+#   chars.csv       char, codepoint, times_occurred, times_used, last_used, first_seen,
+#                   blacklisted
+#   inputs.csv      sha512 (hex), label, n_new_chars, new_chars (as one string)
+#   blacklists.csv  name, char
+#   meta.csv        key, value (cycle, max_used, max_occurrences, ...)
+# NumPy, db.npz with one array per column:
+#   chars:       codepoint uint32, times_occurred/times_used/last_used int64,
+#                first_seen int32 (index into labels, -1 if none), blacklisted bool
+#   labels:      the distinct labels
+#   inputs:      input_sha512 uint8 with shape (n_inputs, 64) (a row per digest, as byte strings
+#                would lose trailing zero bytes), input_label int32 (index into labels),
+#                input_new_chars uint32 (the new characters of every input, one after another)
+#                and input_new_offsets int64 (input i's are new_chars[offsets[i]:offsets[i+1]])
+#   blacklists:  blacklist_names, and the codepoints of each as blacklist_<index>
+#   meta:        cycle, max_used, max_occurrences (0-d arrays)
+#
+# Rows are written one at a time from generators, and the arrays of db.npz one column at a time,
+# so nothing like a copy of the whole database (or the repr dump prints) is held in memory.
+
+EXPORT_DIR = "export"
+
+def char_rows(db):
+    for c, d in db.chars.items():
+        yield (c, ord(c), d[TIMES_OCCURRED], d[TIMES_USED], d[LAST_USED],
+               db.first_seen.get(c, ""), int(c in db.blacklist))
+
+def input_rows(db):
+    for h, entry in db.input_hashes.items():
+        new_chars = entry[1] if len(entry) > 1 else []
+        yield h.hex(), entry[0], len(new_chars), "".join(new_chars)
+
+def blacklist_rows(db):
+    for name, blacklist in db.blacklists.items():
+        for c in blacklist:
+            yield name, c
+
+def meta_rows(db):
+    yield "cycle", db.cycle
+    yield "max_used", db.max_used
+    yield "max_occurrences", db.max_occurrences
+    yield "n_chars", len(db.chars)
+    yield "n_inputs", len(db.input_hashes)
+
+TABLES = {
+    "chars.csv":      (("char", "codepoint", "times_occurred", "times_used", "last_used",
+                        "first_seen", "blacklisted"), char_rows),
+    "inputs.csv":     (("sha512", "label", "n_new_chars", "new_chars"), input_rows),
+    "blacklists.csv": (("name", "char"), blacklist_rows),
+    "meta.csv":       (("key", "value"), meta_rows),
+}
+
+# files are written under a temporary name and renamed when complete (sitebuild.atomic_open)
+def write_csv(db, out_dir):
+    paths = []
+    for filename, (header, rows) in TABLES.items():
+        path = os.path.join(out_dir, filename)
+        with sitebuild.atomic_open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows(db))
+        paths.append(path)
+    return paths
+
+def write_npz(db, out_dir):
+    import numpy as np
+
+    path = os.path.join(out_dir, "db.npz")
+    labels = dict() # label -> index
+    for label in db.first_seen.values():
+        labels.setdefault(label, len(labels))
+    for entry in db.input_hashes.values():
+        labels.setdefault(entry[0], len(labels))
+    n = len(db.chars)
+
+    def columns():
+        yield "codepoint",      np.fromiter(map(ord, db.chars), np.uint32, n)
+        for name, field in (("times_occurred", TIMES_OCCURRED), ("times_used", TIMES_USED),
+                            ("last_used", LAST_USED)):
+            yield name, np.fromiter((d[field] for d in db.chars.values()), np.int64, n)
+        yield "first_seen",     np.fromiter((labels.get(db.first_seen.get(c), -1) for c in db.chars),
+                                            np.int32, n)
+        yield "blacklisted",    np.fromiter((c in db.blacklist for c in db.chars), bool, n)
+        yield "labels",         np.array(list(labels), dtype=str)
+
+        entries = db.input_hashes.values()
+        yield "input_sha512",   np.frombuffer(b"".join(db.input_hashes), np.uint8).reshape(-1, 64)
+        yield "input_label",    np.fromiter((labels[e[0]] for e in entries), np.int32,
+                                            len(entries))
+        new_counts = np.fromiter((len(e[1]) if len(e) > 1 else 0 for e in entries), np.int64,
+                                 len(entries))
+        yield "input_new_offsets", np.concatenate(([0], np.cumsum(new_counts)))
+        yield "input_new_chars", np.fromiter((ord(c) for e in entries if len(e) > 1 for c in e[1]),
+                                             np.uint32, int(new_counts.sum()))
+
+        yield "blacklist_names", np.array(list(db.blacklists), dtype=str)
+        for i, blacklist in enumerate(db.blacklists.values()):
+            yield "blacklist_{}".format(i), np.fromiter(map(ord, blacklist), np.uint32,
+                                                        len(blacklist))
+
+        yield "cycle",           np.array(db.cycle)
+        yield "max_used",        np.array(db.max_used)
+        yield "max_occurrences", np.array(db.max_occurrences)
+
+    # the same layout as np.savez_compressed, but written as each column is made
+    with sitebuild.atomic_open(path) as out, \
+         zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for name, array in columns():
+            with zf.open(name + ".npy", 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, array, allow_pickle=False)
+    return [path]
+
+FORMATS = {"csv": write_csv, "npz": write_npz}
+
+def export(db, out_dir=EXPORT_DIR, formats=FORMATS):
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    paths = []
+    for name in formats:
+        paths += FORMATS[name](db, out_dir)
+    return paths
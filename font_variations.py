@@ -14,6 +14,7 @@
 #   2. UniSourceHanSerifCN-UTF32-H
 #   3. UniSourceHanSerifJP-UTF32-H
 
+import sys
 import math
 import re
 import radicals
@@ -112,10 +113,13 @@ def sel_string(sel):
 # rads is an optional radicals dict from radicals.py:load(), used to sort the characters by
 # radical. if it is omitted then the unicode ordering will be used.
 def gen_variations_html(ivs_chars, cmap_base, cmap_variant,
-        f=open("/dev/stdout", "w"),
+        f=None,
         rads=None,
         title="Variations for Japanese",
         variant_lang="JP"):
+    if f is None:
+        f = sys.stdout
+
     # helper to convert an int to uppercase hex, without the "0x" at the start
     tohex = lambda i: hex(i)[2:].upper()
 
@@ -259,9 +263,11 @@ span {{
     f.write("</table></body></html>")
 
 # generate HTML output for differences in Source Han Serif between CN and JP
+# (the files are loaded through resources, so from the bundle if it has been built)
 def source_han_serif_diff():
-    ivs = process_ivs_file()
-    cn  = process_cmap_file("UniSourceHanSerifCN-UTF32-H")
-    jp  = process_cmap_file("UniSourceHanSerifJP-UTF32-H")
+    import resources
+    ivs = resources.load_ivs()
+    cn  = resources.load_cmap("cn")
+    jp  = resources.load_cmap("jp")
     gen_variations_html(ivs, cn, jp, open("SourceHanSerifDifferencesCNtoJP.html", "w"))
 
@@ -0,0 +1,92 @@
+import bisect
+
+from database import TIMES_OCCURRED
+
+# Index of characters by how often they occurred (times_occurred), for mostfreq.
+#
+# Characters are kept in buckets by count, plus a sorted list of the distinct counts:
+#   buckets: count -> dict of the characters with that count (used as an ordered set)
+#   counts:  sorted list of the keys of buckets
+# There are far fewer distinct counts than characters (most characters occur only a few times),
+# so walking the counts from the top gives the most frequent characters, the rank of a character
+# or a range of ranks without sorting every character.
+#
+# Ranks start at 1. Characters with the same count are ranked in the order they reached that
+# count (when the index is built, in the order of db.chars), not in the order they were first
+# seen like a stable sort of db.chars would, which would mean inserting into the middle of a
+# bucket on every increment. rank() gives tied characters the same (the best) rank.
+#
+# Blacklisted characters aren't in the index. It isn't saved with the database, as it's quick to
+# build from the times_occurred column (Database.frequency_index), and is kept up to date by
+# add_text and update_blacklist once built.
+
+class FrequencyIndex:
+    def __init__(self):
+        self.buckets = dict()
+        self.counts  = []
+        self.size    = 0
+
+    @classmethod
+    def from_database(cls, db):
+        index = cls()
+        for c, d in db.chars.items():
+            if c in db.blacklist:
+                continue
+            bucket = index.buckets.get(d[TIMES_OCCURRED])
+            if bucket is None:
+                bucket = index.buckets[d[TIMES_OCCURRED]] = dict()
+            bucket[c] = None
+        index.counts = sorted(index.buckets)
+        index.size = sum(map(len, index.buckets.values()))
+        return index
+
+    def __len__(self):
+        return self.size
+
+    def add(self, c, count):
+        bucket = self.buckets.get(count)
+        if bucket is None:
+            bucket = self.buckets[count] = dict()
+            bisect.insort(self.counts, count)
+        bucket[c] = None
+        self.size += 1
+
+    def remove(self, c, count):
+        bucket = self.buckets[count]
+        del bucket[c]
+        if not bucket:
+            del self.buckets[count]
+            del self.counts[bisect.bisect_left(self.counts, count)]
+        self.size -= 1
+
+    # c's count went up by one
+    def increment(self, c, count):
+        self.remove(c, count - 1)
+        self.add(c, count)
+
+    # rank of a character with the given count: 1 + the number of characters with a higher count
+    def rank(self, count):
+        higher = self.counts[bisect.bisect_right(self.counts, count):]
+        return 1 + sum(len(self.buckets[n]) for n in higher)
+
+    # yields (rank, char, count) for ranks first to last (inclusive), most frequent first.
+    # last=None goes to the end.
+    def ranked(self, first=1, last=None):
+        rank = 1
+        for count in reversed(self.counts):
+            if last is not None and rank > last:
+                return
+            bucket = self.buckets[count]
+            if rank + len(bucket) <= first:
+                rank += len(bucket) # the whole bucket comes before first
+                continue
+            for c in bucket:
+                if rank >= first:
+                    if last is not None and rank > last:
+                        return
+                    yield rank, c, count
+                rank += 1
+
+    # the n most frequent characters
+    def top(self, n):
+        return self.ranked(1, n)
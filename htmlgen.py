@@ -1,5 +1,9 @@
+import os
 import sys
+import html
+import urllib.parse
 import datetime
+import concurrent.futures
 import cedict
 from cedict2pinyin import add_accents
 
@@ -7,31 +11,16 @@ from cedict2pinyin import add_accents
 # HTML table generation #
 #########################
 
-# Generates HTML output for a character practice sheet
-def charsheet(chars, n_boxes, n_pages,
-              pinyin=None, f=open("/dev/stdout", "w"),
-              title="Randomly Generated Spaced-Repetition Character Sheet",
-              date=datetime.date.today().isoformat()):
-    td_width  = 100 / (n_boxes + 1)
-    td_height = 65  / (len(chars) / n_pages)
+# change this whenever the output of the templates below changes, so that cached pages and rows
+# made with the old templates aren't used
+TEMPLATE_VERSION = 2
 
-    # The value 65 for td_height was found experimentally.
-    # This seems to actually work for making everything fit on the page,
-    # but it's not really guaranteed and will probably break.
-    # this will do for now
-
-    # height scaling for pinyin text; by default this is unused
-    py_height = 1
-    if pinyin:
-        # if we're including pinyin for each character, allocate vertical space for it
-        # just like before this is a hack that seems to work in practice, but isn't really ideal
-        td_height = 70 / (len(chars) / n_pages)
-        py_height = td_height * 0.25
-        td_height = td_height * 0.75
+# Pages are built as a list of strings that's joined and written in one go, rather than with a
+# write per row. The templates below are only parsed once, when the module is loaded, and the
+# bound .format methods are used directly.
 
-    # generate start of HTML page including CSS
-    f.write(\
-"""<!DOCTYPE html>
+# format args: title, date, td_width, td_height, py_height
+CHARSHEET_HEAD = """<!DOCTYPE html>
 <html lang="zh">
 <head><title>{} {}</title>
 <style>
@@ -67,15 +56,59 @@ a {{
 }}
 </style>
 </head>
-<body><table>""".format(title, date, td_width, td_height, py_height))
-   
+<body><table>""".format
+
+# format args: codepoint, char
+CHAR_LINK = '<a href="https://zici.info/decomp/#{:x}N">{}</a>'.format
+
+# format args: codepoint, char, char, pinyin
+# clicking the pinyin shows the yellowbridge dictionary entry
+CHARSHEET_ROW_PINYIN = ('<tr><td><a href="https://zici.info/decomp/#{:x}N">{}</a>'
+    '<a class="p" href="https://yellowbridge.com/chinese/sentsearch.php?word={}">{}</a>').format
+
+# format args: codepoint, char
+CHARSHEET_ROW = '<tr><td><a href="https://zici.info/decomp/#{:x}N">{}</a>'.format
+
+PAGE_END = "</table></body></html>"
+
+CHARSHEET_TITLE = "Randomly Generated Spaced-Repetition Character Sheet"
+
+# Generates HTML output for a character practice sheet
+# (f defaults to stdout and date defaults to today)
+def charsheet(chars, n_boxes, n_pages,
+              pinyin=None, f=None,
+              title=CHARSHEET_TITLE,
+              date=None):
+    if f is None:
+        f = sys.stdout
+    if date is None:
+        date = datetime.date.today().isoformat()
+
+    td_width  = 100 / (n_boxes + 1)
+    td_height = 65  / (len(chars) / n_pages)
+
+    # The value 65 for td_height was found experimentally.
+    # This seems to actually work for making everything fit on the page,
+    # but it's not really guaranteed and will probably break.
+    # this will do for now
+
+    # height scaling for pinyin text; by default this is unused
+    py_height = 1
+    if pinyin:
+        # if we're including pinyin for each character, allocate vertical space for it
+        # just like before this is a hack that seems to work in practice, but isn't really ideal
+        td_height = 70 / (len(chars) / n_pages)
+        py_height = td_height * 0.25
+        td_height = td_height * 0.75
+
+    # start of HTML page including CSS
+    page = [CHARSHEET_HEAD(html.escape(title), html.escape(date), td_width, td_height, py_height)]
+
     # generate the empty boxes / td-terminators once, rather than every loop
     boxes = "</td>" + "<td></td>" * n_boxes + "</tr>"
-    
+
     # generate rows for each character
-    for i, c in enumerate(chars):
-        a = """<a href="https://zici.info/decomp/#{}N">{}</a>""".format(hex(ord(c))[2:], c)
-        
+    for c in chars:
         if pinyin:
             # if a dictionary is present, look up the pinyin for the character
             py = '?'
@@ -83,26 +116,60 @@ a {{
                 py = pinyin[c][0] # use the first definition available
             else:
                 sys.stderr.write("no pinyin found for {}\n".format(c))
-
-            # clicking the pinyin shows the yellowbridge dictionary entry
-            a += '<a class="p" href="https://yellowbridge.com/chinese/sentsearch.php?word={}">{}</a>'\
-                .format(c, py)
-
-        f.write("<tr><td>" + a + boxes)
+            page.append(CHARSHEET_ROW_PINYIN(ord(c), c, c, py))
+        else:
+            page.append(CHARSHEET_ROW(ord(c), c))
+        page.append(boxes)
 
     # finally terminate the HTML page
-    f.write("</table></body></html>")
+    page.append(PAGE_END)
+    f.write("".join(page))
 
     return True
 
-# defs is cedict.load() format
-def summary(words, defs,
-        f=open("/dev/stdout", "w"),
-        title="Randomly Generated Summary"):
+##########################
+# Rendering many sheets  #
+##########################
+
+# pinyin table of a worker process, set once when the worker starts rather than sent per job
+worker_pinyin = None
+
+def render_worker_init(pinyin):
+    global worker_pinyin
+    worker_pinyin = pinyin
+
+def render_charsheet_job(job):
+    chars, n_boxes, n_pages, path, title, date = job
+    with open(path, 'w') as f:
+        charsheet(chars, n_boxes, n_pages, worker_pinyin, f, title, date)
+    return path
 
-    # generate start of HTML page including CSS
-    f.write(\
-"""<!DOCTYPE html>
+# a sheet only takes a fraction of a millisecond to render, so for fewer jobs than this starting
+# the worker processes takes longer than rendering them all in this one
+PARALLEL_MIN_JOBS = 200
+
+# render each job, a tuple of (chars, n_boxes, n_pages, path, title, date), to its path using a
+# process pool. The output is the same as calling charsheet for each job in turn.
+def render_charsheets(jobs, pinyin=None, workers=None):
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(jobs) >= PARALLEL_MIN_JOBS else 1
+
+    if workers <= 1:
+        # not worth starting processes for
+        render_worker_init(pinyin)
+        for job in jobs:
+            render_charsheet_job(job)
+        return
+
+    # with the fork start method (the default on Linux) the pinyin table is shared with the
+    # workers, rather than being pickled
+    with concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=render_worker_init, initargs=(pinyin,)) as executor:
+        # list() so that any exceptions from the workers are raised here
+        list(executor.map(render_charsheet_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+# format args: title
+SUMMARY_HEAD = """<!DOCTYPE html>
 <html lang="zh">
 <head><title>{}</title>
 <style>
@@ -149,58 +216,110 @@ a {{
 </style>
 </head>
 <body><table>
-<tr><th>词</th><th>拼音</th><th>定义</th></tr>""".format(title))
-   
-    # generate rows for each entry
-    for word in words:
-        row = '<tr><td class="c">'
-        for c in word:
-            row += '<a href="https://zici.info/decomp/#{}N">{}</a>'.format(hex(ord(c))[2:], c)
-        row += "</td>"
-        
-        py, definition = '?', None
-        if word in defs:
-            for entry in defs[word]:
-                py, definition = entry[cedict.PINYIN_INDEX], entry[cedict.DEF_INDEX]
-                
-                if definition.startswith("variant"):
-                    continue # skip variant definitions
-
-                # split slashes in definitions over lines, skipping 'variant' definitions again
-                definitions =\
-                    filter(lambda d: not d.startswith("variant"), definition.split(sep='/'))
-                definition = ""
-                line = ""
-                LINE_CUTOFF = 80
-                for d in definitions:
-                    if len(line) + len(d) + 3 < LINE_CUTOFF:
-                        if len(line):
-                            line += " / "
-                        line += d
-                    else:
-                        if len(definition):
-                            definition += "<br>"
-                        definition += line
-                        line = ""
-                if len(line):
-                    if len(definition):
-                        definition += "<br>"
-                    definition += line
-
-                py = "<br>".join(map(add_accents, py.split()))
-                
-                # clicking the pinyin shows the yellowbridge dictionary entry
-                row += '<td class="p"><a href="https://www.yellowbridge.com/chinese/dictionary.php?word=={}">{}</a></td>'\
-                    .format(word, py)
-                row += '<td>{}</td></tr>'.format(definition)
-                f.write(row)
-
-                row = "<tr><td>↑</td>"
+<tr><th>词</th><th>拼音</th><th>定义</th></tr>""".format
+
+# format args: word, pinyin, definition
+# clicking the pinyin shows the yellowbridge dictionary entry
+SUMMARY_ENTRY = ('<td class="p"><a href="https://www.yellowbridge.com/chinese/dictionary.php?word=={}">{}</a></td>'
+    '<td>{}</td></tr>').format
+
+# start of the row for the second and later entries of a word
+SUMMARY_CONTINUATION = "<tr><td>↑</td>"
+
+LINE_CUTOFF = 80
+
+# split slashes in definitions over lines, skipping 'variant' definitions
+def wrap_definition(definition):
+    lines = []
+    line = ""
+    for d in definition.split(sep='/'):
+        if d.startswith("variant"):
+            continue
+        if len(line) + len(d) + 3 < LINE_CUTOFF:
+            if len(line):
+                line += " / "
+            line += d
         else:
-            sys.stderr.write("no definition found for {}\n".format(word))
-    # finally terminate the HTML page
-    f.write("</table></body></html>")
+            lines.append(line)
+            line = ""
+    if len(line):
+        lines.append(line)
+
+    # lines are separated by <br>, but not preceded by one if nothing came before them
+    start = 0
+    while start < len(lines) and not lines[start]:
+        start += 1
+    return "<br>".join(lines[start:])
+
+# the rows of the summary table for a single word, or "" if it has no definition
+def summary_rows(word, defs):
+    if word not in defs:
+        sys.stderr.write("no definition found for {}\n".format(word))
+        return ""
+
+    rows = ['<tr><td class="c">']
+    for c in word:
+        rows.append(CHAR_LINK(ord(c), c))
+    rows.append("</td>")
+    first_row = "".join(rows)
+
+    rows = []
+    row = first_row
+    for entry in defs[word]:
+        py, definition = entry[cedict.PINYIN_INDEX], entry[cedict.DEF_INDEX]
+
+        if definition.startswith("variant"):
+            continue # skip variant definitions
+
+        py = "<br>".join(map(add_accents, py.split()))
+
+        rows.append(row)
+        rows.append(SUMMARY_ENTRY(word, py, wrap_definition(definition)))
+
+        row = SUMMARY_CONTINUATION
+
+    return "".join(rows)
+
+# defs is cedict.load() format
+# (f defaults to stdout)
+def summary(words, defs,
+        f=None,
+        title="Randomly Generated Summary"):
+    if f is None:
+        f = sys.stdout
+
+    summary_page([summary_rows(word, defs) for word in words], f, title)
 
     return False
 
+# write a summary page made of rows from summary_rows()
+def summary_page(rows, f, title="Randomly Generated Summary"):
+    # start of HTML page including CSS, then rows for each entry, and finally terminate the page
+    f.write("".join([SUMMARY_HEAD(html.escape(title))] + rows + [PAGE_END]))
+
+# format args: title, title
+INDEX_HEAD = """<!DOCTYPE html>
+<html lang="zh">
+<head><meta charset="utf-8"><title>{}</title>
+<style>
+body {{
+    font-size: 150%;
+}}
+</style>
+</head>
+<body><h1>{}</h1>
+<ul>
+""".format
+
+# format args: href, text
+INDEX_ENTRY = '<li><a href="{}">{}</a></li>\n'.format
+
+# write a page linking to other pages. entries is a list of (href, text)
+def index(entries, f=None, title="Index"):
+    if f is None:
+        f = sys.stdout
 
+    f.write("".join([INDEX_HEAD(html.escape(title), html.escape(title))]
+                    + [INDEX_ENTRY(urllib.parse.quote(href), html.escape(text))
+                       for href, text in entries]
+                    + ["</ul></body></html>"]))
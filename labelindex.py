@@ -0,0 +1,70 @@
+import blacklist
+
+# Indexes of the database by label (the lesson or handout names given to add), so that "which
+# characters did lesson X introduce" and "which files have label Y" don't mean going through all
+# of first_seen and input_hashes:
+#   chars:  label -> dict of the characters first seen in files with that label (an ordered set)
+#   hashes: label -> dict of the hashes of the files with that label
+#
+# Like the frequency index it isn't saved with the database, but built from first_seen and
+# input_hashes when first needed (Database.label_index) and then kept up to date by add_text.
+#
+# For generating from only some labels, candidates() gives the characters of the labels as a
+# codepoint bitset (the same structure as a blacklist), whose mask() can be combined with the
+# blacklist's. The bitset of each label is kept until the label changes.
+
+class LabelIndex:
+    def __init__(self):
+        self.chars  = dict()
+        self.hashes = dict()
+        self.bitsets = dict() # label -> blacklist.Blacklist of its chars
+
+    @classmethod
+    def from_database(cls, db):
+        index = cls()
+        for c, label in db.first_seen.items():
+            index.chars.setdefault(label, dict())[c] = None
+        for h, entry in db.input_hashes.items():
+            index.hashes.setdefault(entry[0], dict())[h] = None
+        return index
+
+    def labels(self):
+        return self.hashes.keys() | self.chars.keys()
+
+    def add_char(self, c, label):
+        self.chars.setdefault(label, dict())[c] = None
+        self.bitsets.pop(label, None)
+
+    def add_hash(self, h, label):
+        self.hashes.setdefault(label, dict())[h] = None
+
+    # the file with hash h and the characters first seen in it were relabeled
+    def relabel(self, h, chars, old_label, new_label):
+        remove(self.hashes, old_label, h)
+        self.add_hash(h, new_label)
+        for c in chars:
+            remove(self.chars, old_label, c)
+            self.add_char(c, new_label)
+        self.bitsets.pop(old_label, None)
+
+    # the characters first seen in files with the label, in the order they were added
+    def lesson_chars(self, label):
+        return list(self.chars.get(label, ()))
+
+    def lesson_hashes(self, label):
+        return list(self.hashes.get(label, ()))
+
+    # codepoint bitset of the characters of all of the labels
+    def candidates(self, labels):
+        for label in labels:
+            if label not in self.bitsets:
+                self.bitsets[label] = blacklist.Blacklist(self.chars.get(label, ()))
+        return blacklist.combine(self.bitsets[label] for label in labels)
+
+# remove key from the dict index[label], removing the label if it's left empty
+def remove(index, label, key):
+    entries = index.get(label)
+    if entries is not None:
+        entries.pop(key, None)
+        if not entries:
+            del index[label]
@@ -6,37 +6,38 @@ import sys, datetime
 import os
 
 from database import *
-import htmlgen
-import cedict
+from timings import timings
+import resources
 
-# special generator for February revision pack
-def feb_revision(db):
-    n_chars = 30
-    n_boxes = 10
-    n_pages = 2
+# note: modules that take a while to import (numpy, htmlgen, cedict, ...) are imported by the
+# commands that need them, so that simple commands and argument errors start quickly.
 
-    out_dir = "feb2020/"
+# generate a revision pack: one sheet per date in out_dir, and an extras sheet for any
+# characters that weren't generated on any of the days.
+# all the days are generated first, then the sheets are rendered in parallel.
+def revision_pack(db, out_dir, title, extras_title, dates,
+                  n_chars=30, n_boxes=10, n_pages=2):
+    import sitebuild
+    from sheetcache import SheetCache
 
-    pinyin = load_pinyin()
+    import readings
+
+    with timings.phase("load_pinyin"):
+        pinyin = resources.load_pinyin()
 
     if not os.path.isdir(out_dir):
         # if old directory doesn't exist, create it
         os.mkdir(out_dir)
-    
-    for day in range(0,29): # 2020 is a leap year
-        date = datetime.date(2020, 2, day + 1).isoformat()
+
+    # each job is the arguments to htmlgen.charsheet, with the output path instead of a file
+    jobs = []
+    for date in dates:
         path = out_dir + date + ".htm"
         print("Generating", path)
-        htmlgen.charsheet(
-                db.generate(n_chars),
-                n_boxes,
-                n_pages,
-                pinyin,
-                open(path, 'w'),
-                "February Revision",
-                date)
-    
-    print("Done")
+        with timings.phase("generate"):
+            chars = db.generate(n_chars)
+        timings.count("chars_generated", len(chars))
+        jobs.append((chars, n_boxes, n_pages, path, title, date))
 
     # ensure all characters were covered
     not_generated = []
@@ -50,16 +51,26 @@ def feb_revision(db):
             print("Warning: {} was not generated".format(c))
             not_generated.append(c)
 
+    extra_path = out_dir + "extras.htm"
     if len(not_generated) > 0:
         print("Warning: {} characters in total were NOT generated".format(not_generated))
-        extra_path = out_dir + "extras.htm"
-        htmlgen.charsheet(
-                not_generated,
-                n_boxes,
-                max(1, n_pages// n_chars),
-                pinyin,
-                open(extra_path, 'w'),
-                "February 2020 Revision Extras/Overflow")
+        jobs.append((not_generated, n_boxes, max(1, n_pages// n_chars), extra_path,
+                     extras_title, None))
+
+    with timings.phase("render"):
+        # show the readings most used in our material
+        pinyin = readings.prefer(pinyin, db.readings, set().union(*(job[0] for job in jobs)))
+        cache = SheetCache()
+        cache.render_charsheets(jobs, pinyin)
+        # the sheets were written above, so only the index and .gz copies are added
+        sitebuild.publish(out_dir, [(os.path.basename(job[3]), job[5] or job[4]) for job in jobs],
+                          title)
+    timings.count("sheets_rendered", cache.misses)
+    timings.count("sheet_cache_hits", cache.hits)
+
+    print("Done")
+
+    if len(not_generated) > 0:
         print("Non-generated characters are in", extra_path)
 
     if max_dupes > 1:
@@ -72,93 +83,564 @@ def feb_revision(db):
 
     return should_commit
 
+# special generator for February revision pack
+def feb_revision(db):
+    dates = [datetime.date(2020, 2, day + 1).isoformat()
+             for day in range(0,29)] # 2020 is a leap year
+    return revision_pack(db, "feb2020/", "February Revision",
+                         "February 2020 Revision Extras/Overflow", dates)
+
 # generate summaries for any labels that don't already have a summary/label.html
+# the rows for each word come from the summary cache, so CEDICT is only loaded if there are
+# words that haven't been rendered before.
 def gen_summaries(db):
+    import io
+    import hashlib
+    import htmlgen
+    import sitebuild
+    from summarycache import SummaryCache
+
     dir_path = "summaries/"
 
-    defs = cedict.load()
+    def load_cedict():
+        with timings.phase("load_cedict"):
+            return resources.load_cedict()
 
-    if not os.path.isdir(dir_path):
-        # if old directory doesn't exist, create it
-        os.mkdir(dir_path)
+    cache = SummaryCache()
+
+    # all the characters of each label, in the order they were added
+    index = db.label_index()
+    labels = {label: index.lesson_chars(label) for label in index.chars}
+    labels.pop('?', None) # skip ? label (labels without chars aren't in index.chars)
+
+    # a page only depends on its characters, their dictionary entries and the templates, so it's
+    # rebuilt when one of those changes. The rows are the rendered entries (and cached), so they
+    # stand in for the entries: a new CEDICT release only rebuilds pages whose entries changed.
+    def page(label, chars):
+        title = "Summary for " + label
+        rows = cache.get(chars, load_cedict)
+        def render():
+            f = io.StringIO()
+            htmlgen.summary_page(rows, f, title)
+            return f.getvalue()
+        rows_hash = hashlib.sha256("".join(rows).encode('utf-8')).hexdigest()
+        return sitebuild.Page(label + ".htm", title,
+                              [htmlgen.TEMPLATE_VERSION, title, chars, rows_hash], render)
+
+    pages = [page(label, chars) for label, chars in labels.items()]
+
+    with timings.phase("render"):
+        built = sitebuild.build(dir_path, pages, "Summaries")
+
+    for p in built:
+        print("Generated", dir_path + p.filename)
+    print("{} of {} pages were up to date".format(len(pages) + 1 - len(built), len(pages) + 1))
+    timings.count("summaries_rendered", len(built))
+
+    cache.save()
+    timings.count("summary_cache_hits", cache.hits)
+    timings.count("summary_cache_misses", cache.misses)
+
+    return False
+
+
+############
+# Commands #
+############
+
+# each command takes the database and the command line arguments (starting with the command name)
+# and returns True if the database should be saved.
 
-    for h, [label, chars] in db.input_hashes.items():
-        if label == '?' or not len(chars):
-            continue # skip ? label and empty chars
+# gen [n_chars], genhtml [n_chars n_boxes n_pages]
+# "sched" and "schedhtml" are the same but use the due-date scheduler
+# gen and genhtml also take --labels=label,... to only select characters from those lessons
+def cmd_generate(db, args):
+    labels = None
+    for arg in args:
+        if arg.startswith("--labels="):
+            labels = arg[len("--labels="):].split(',')
+            args = [a for a in args if a != arg]
+            break
 
-        path = dir_path + label + ".htm"
+    # default to 30 chars
+    n_chars = int(args[1]) if len(args) >= 2 else 30
+
+    with timings.phase("generate"):
+        if args[0].startswith("sched"):
+            if labels:
+                raise CommandError("--labels can't be used with sched")
+            gen = db.schedule(n_chars)
+        else:
+            gen = db.generate(n_chars, labels=labels)
+    timings.count("chars_generated", len(gen))
+
+    if args[0].endswith("html"):
+        from sheetcache import SheetCache
+
+        # default to 10 boxes for writing characters
+        n_boxes = int(args[2]) if len(args) >= 3 else 10
+        # default to 2 pages
+        n_pages = int(args[3]) if len(args) >= 4 else 2
+
+        cache = SheetCache()
+        with timings.phase("render"):
+            saved = cache.charsheet(gen, n_boxes, n_pages)
+        timings.count("sheet_cache_hits", cache.hits)
+        return saved
+    else:
+        print(gen)
+        return True
+
+# confusables [top_k]
+# (re)builds the index of similar looking and sounding characters used by genconf
+def cmd_confusables(db, args):
+    import confusables
+
+    top_k = int(args[1]) if len(args) >= 2 else confusables.TOP_K
+    with timings.phase("load_resources"):
+        rads = resources.load_radicals()
+        pinyin = resources.load_pinyin()
+    with timings.phase("build"):
+        index = confusables.build(db, rads, pinyin, top_k)
+    confusables.save(index)
+    print("Indexed confusables of {} characters in {}".format(
+        len(index["chars"]), confusables.INDEX_PATH))
+    return False
+
+# genconf [n_chars]
+# generates like gen, printing each character followed by the characters it's most easily
+# confused with (from the index built by the confusables command), for distractor drills
+def cmd_genconf(db, args):
+    import confusables
+
+    if not os.path.isfile(confusables.INDEX_PATH):
+        raise CommandError("No confusables index, run the confusables command first")
+    index = confusables.load()
+
+    n_chars = int(args[1]) if len(args) >= 2 else 30
+    with timings.phase("generate"):
+        gen = db.generate(n_chars)
+    for c, similar in zip(gen, confusables.lookup(index, gen)):
+        print(c, similar)
+    return True
+
+# add path label [relabel|keep] [--readings]
+# the optional last argument answers whether to relabel a file that was already added, instead
+# of asking. --readings also counts the readings of heteronyms in the file (see readings.py),
+# which needs CEDICT.
+def cmd_add(db, args):
+    readings = "--readings" in args
+    args = [arg for arg in args if arg != "--readings"]
+    if len(args) < 3:
+        raise CommandError(COMMANDS["add"][2]) # the flag was counted as an argument
+    if not os.path.isfile(args[1]):
+        raise CommandError("File '{}' does not exist".format(args[1]))
+
+    segmenter = None
+    if readings:
+        with timings.phase("load_segmenter"):
+            segmenter = resources.load_segmenter()
+
+    relabel = {"relabel": True, "keep": False}.get(args[3]) if len(args) >= 4 else None
+
+    n_chars = len(db.chars)
+    with timings.phase("ingest"):
+        added = db.add_text(args[1], args[2], relabel=relabel, segmenter=segmenter)
+    timings.count("chars_added", len(db.chars) - n_chars)
+    return added
+
+def cmd_summary(db, args):
+    return gen_summaries(db)
+
+def cmd_dump(db, args):
+    print(db.__dict__)
+    return False # no need to save, we only dumped the db
+
+# search [components] [strokes | first-last] [--type=⿰] [--all]
+# print the characters in the database (or in the radicals data, with --all) that contain all of
+# the components, have that many strokes and that composition type (see charsearch.py),
+# e.g. "search 氵 8-10". Blacklisted characters are skipped.
+def cmd_search(db, args):
+    import numpy as np
+
+    components, strokes, composition_type, in_db = [], None, None, True
+    for arg in args[1:]:
+        if arg == "--all":
+            in_db = False
+        elif arg.startswith("--type="):
+            composition_type = arg[len("--type="):]
+        elif arg.replace("-", "").isdigit():
+            first, sep, last = arg.partition("-")
+            if not first.isdigit() or (sep and not last.isdigit()):
+                raise CommandError("Bad stroke range '{}', expected N or N-M".format(arg))
+            strokes = (int(first), int(last or first))
+        else:
+            components += list(arg)
+    if not components and strokes is None and composition_type is None:
+        raise CommandError("Usage: search [components] [strokes | first-last] [--type=T] [--all]")
+
+    with timings.phase("load_index"):
+        index = resources.load_search_index()
+
+    chars = None
+    if in_db:
+        chars = np.fromiter(map(ord, db.chars), np.uint32, len(db.chars))
+        chars = chars[~db.blacklist.mask(chars)]
+    with timings.phase("search"):
+        found = index.search(components, strokes, composition_type, chars)
+    print("".join(map(chr, found)))
+    print("{} characters".format(len(found)))
+    return False
 
-        if os.path.isfile(path):
-            print("Summary for", label, "exists")
-            continue # skip existing summaries
+# export [out_dir] [--format=csv|npz]
+# write the database as columnar CSV and/or NumPy files for analysis (see export.py)
+def cmd_export(db, args):
+    import export
 
-        htmlgen.summary(chars, defs, open(path, 'w'), "Summary for " + label)
-        print("Generated", path)
+    args = args[1:]
+    formats = export.FORMATS
+    for arg in args[:]:
+        if arg.startswith("--format="):
+            formats = [arg[len("--format="):]]
+            if formats[0] not in export.FORMATS:
+                raise CommandError("Unknown export format '{}'".format(formats[0]))
+            args.remove(arg)
 
+    with timings.phase("export"):
+        paths = export.export(db, args[0] if args else export.EXPORT_DIR, formats)
+    for path in paths:
+        print("Wrote", path)
     return False
 
+# mostfreq [N | first-last | rank char...] [--limit N]
+# print characters and their frequency, most frequent first (blacklisted characters are skipped):
+# all of them, the top N, or the characters ranked first to last. "rank" prints the frequency
+# rank of each given character instead. Lines are printed as they're found, up to --limit lines.
+def cmd_mostfreq(db, args):
+    args = args[1:]
+    limit = None
+    if "--limit" in args:
+        i = args.index("--limit")
+        if i + 1 >= len(args) or not args[i + 1].isdigit():
+            raise CommandError("--limit requires a number")
+        limit = int(args[i + 1])
+        del args[i:i + 2]
+
+    with timings.phase("index"):
+        index = db.frequency_index()
+
+    if len(args) and args[0] == "rank":
+        for c in "".join(args[1:])[:limit]:
+            if c not in db.chars or c in db.blacklist:
+                print(c, "-", 0)
+            else:
+                count = db.chars[c][TIMES_OCCURRED]
+                print(c, index.rank(count), count)
+        return False
+
+    first, last = 1, None
+    if len(args):
+        first_arg, dash, last_arg = args[0].partition('-')
+        try:
+            if dash:
+                first, last = int(first_arg), int(last_arg)
+            else:
+                last = int(first_arg)
+        except ValueError:
+            raise CommandError("Usage: mostfreq [N | first-last | rank char...] [--limit N]")
+    if limit is not None:
+        last = first + limit - 1 if last is None else min(last, first + limit - 1)
+
+    for rank, c, count in index.ranked(first, last):
+        print(c, count)
+    return False
+
+# lesson [label...]
+# without labels, lists every label with its number of characters and files. with labels, prints
+# the characters first seen in each of them.
+def cmd_lesson(db, args):
+    index = db.label_index()
+    if len(args) < 2:
+        for label in sorted(index.labels()):
+            print("{}: {} characters, {} files".format(
+                label, len(index.lesson_chars(label)), len(index.lesson_hashes(label))))
+        return False
+
+    for label in args[1:]:
+        if label not in index.labels():
+            raise CommandError("No lesson is labelled '{}'".format(label))
+        print("{}: {}".format(label, "".join(index.lesson_chars(label))))
+    return False
+
+def cmd_resched(db, args):
+    # (re)initialise the scheduler's due dates from the times_used/last_used columns
+    import scheduler
+    db.scheduler = scheduler.Scheduler.from_database(db)
+    print("Scheduled", len(db.scheduler), "characters")
+    return True
+
+def cmd_simulate(db, args):
+    # compare generation policies on a copy of the db; never modifies the real one
+    import simulate
+    return simulate.main(db, args[1:])
+
+def cmd_serve(db, args):
+    # keep the db and reference data loaded and serve sheets over HTTP on localhost
+    import server
+    return server.main(db, args[1:], save)
+
+# watch [inbox] [--interval=SECONDS] [--readings]
+# add the files put in the inbox directory (see watch.py)
+def cmd_watch(db, args):
+    import watch
+    return watch.main(db, args[1:], save, load)
+
+# batch jobs.json
+# runs a list of commands against the same database and loaded resources, then saves once at the
+# end. If any command fails, nothing is saved, and the changes of a command that doesn't save
+# (e.g. a declined prompt) are undone before the next one. jobs.json contains a list of jobs,
+# where each job is a list of command line arguments, or an object with the arguments and a file
+# to write the command's output to:
+#   [
+#       ["add", "lesson1.txt", "L1", "keep"],
+#       ["blacklist"],
+#       {"args": ["genhtml", 30, 10, 2], "stdout": "sheet.htm"},
+#       ["summary"]
+#   ]
+def cmd_batch(db, args):
+    import json
+    import pickle
+    import contextlib
+
+    try:
+        with open(args[1]) as f:
+            jobs = json.load(f)
+    except (OSError, ValueError) as e:
+        raise CommandError("Failed to read jobs file: {}".format(e))
+
+    should_save = False
+    for i, job in enumerate(jobs):
+        if isinstance(job, dict):
+            job_args, stdout = job.get("args", []), job.get("stdout")
+        else:
+            job_args, stdout = job, None
+        job_args = [str(arg) for arg in job_args] or ["gen"]
+
+        command = find_command(job_args[0])
+        if not command or command[0] in (cmd_batch, cmd_serve, cmd_watch):
+            raise CommandError("Job {}: invalid command {}".format(i + 1, job_args))
+        function, n_args, usage = command
+        if len(job_args) - 1 < n_args:
+            raise CommandError("Job {}: {}".format(i + 1, usage))
+
+        sys.stderr.write("Job {}: {}\n".format(i + 1, " ".join(job_args)))
+        snapshot = pickle.dumps(db)
+        try:
+            if stdout:
+                with open(stdout, 'w') as f, contextlib.redirect_stdout(f):
+                    result = function(db, job_args)
+            else:
+                result = function(db, job_args)
+        except Exception as e:
+            # the changes so far are only in memory, so not saving them rolls everything back
+            # (files written by earlier jobs are left as they are)
+            raise CommandError("Job {} failed, database not saved: {}".format(i + 1, e))
+        if not result:
+            # it may have changed the database before deciding not to save, e.g. when a revision
+            # is declined, so go back to how it was (keeping what's only for this run, like _base)
+            restored = pickle.loads(snapshot)
+            if hasattr(db, "_base"):
+                restored._base = db._base
+            db.__dict__ = restored.__dict__
+        should_save = should_save or result
+
+    return should_save
+
+# blacklist [path [name]]
+# replaces the named blacklist (by default, "default" from blacklist.txt) with the file's hanzi
+def cmd_blacklist(db, args):
+    if len(args) >= 2 and not os.path.isfile(args[1]):
+        raise CommandError("File '{}' does not exist".format(args[1]))
+    return db.update_blacklist(*args[1:3])
+
+def cmd_feb(db, args):
+    return feb_revision(db)
+
+# update-cedict path
+# installs a new CEDICT release at path (copying it over the current one) and updates what's
+# built from it, diffing it against the CEDICT in the resource bundle by headword. Only what
+# depends on the headwords that changed is redone: the pinyin of their characters, their rows in
+# the summary cache and the summary pages with them. (The segmenter is quick to build, so it's
+# rebuilt.)
+def cmd_update_cedict(db, args):
+    import cedict
+    import cedict2pinyin
+    import readings
+    import sitebuild
+    from summarycache import SummaryCache
+
+    res = resources.get()
+    with timings.phase("load_cedict"):
+        old = res.get("cedict")
+        new = cedict.load(args[1])
+    with timings.phase("diff"):
+        changed = cedict.changed_words(old, new)
+    chars = {c for word in changed for c in word}
+    print("{} headwords changed, with {} characters".format(len(changed), len(chars)))
+    timings.count("headwords_changed", len(changed))
+    if not changed:
+        return False
+
+    cache = SummaryCache() # still for the old release
+    with timings.phase("patch"):
+        pinyin = dict(res.get("pinyin"))
+        cedict2pinyin.update(pinyin, new, chars)
+        with open(args[1], 'rb') as f:
+            sitebuild.write_atomic(cedict.DEFAULT_PATH, f.read())
+        res.patch({"cedict": new, "pinyin": pinyin, "segmenter": readings.Segmenter(new)})
+    cache.dictionary_changed(changed)
+    cache.save()
+    resources.clear()
+
+    return gen_summaries(db)
+
+# build-resources
+# compiles CEDICT, the pinyin table, radicals etc. into resources.bundle (see resources.py),
+# which has to be done again whenever one of them changes
+def cmd_build_resources(db, args):
+    with timings.phase("build"):
+        sections = resources.build()
+    print("Built {} with {}".format(resources.BUNDLE_PATH, ", ".join(sections)))
+    return False
+
+# revision start_date n_days [n_chars n_boxes n_pages]
+# like feb, but for any range of days, written to revision/
+def cmd_revision(db, args):
+    start = datetime.date.fromisoformat(args[1])
+    dates = [(start + datetime.timedelta(days=day)).isoformat() for day in range(int(args[2]))]
+    sizes = [int(arg) for arg in args[3:6]]
+    return revision_pack(db, "revision/", "Revision", "Revision Extras/Overflow", dates, *sizes)
+
+# name -> (function, minimum number of arguments after the name, usage message)
+COMMANDS = {
+    "gen":      (cmd_generate, 0, None),
+    "add":      (cmd_add,      2, "Path of file to add and label for this file required."),
+    "summary":  (cmd_summary,  0, None),
+    "dump":     (cmd_dump,     0, None),
+    "export":   (cmd_export,   0, None),
+    "search":   (cmd_search,   0, None),
+    "mostfreq": (cmd_mostfreq, 0, None),
+    "lesson":   (cmd_lesson,   0, None),
+    "confusables": (cmd_confusables, 0, None),
+    "genconf":  (cmd_genconf,  0, None),
+    "resched":  (cmd_resched,  0, None),
+    "simulate": (cmd_simulate, 0, None),
+    "serve":    (cmd_serve,    0, None),
+    "watch":    (cmd_watch,    0, None),
+    "batch":    (cmd_batch,    1, "Path of jobs file required."),
+    "blacklist":(cmd_blacklist,0, None),
+    "feb":      (cmd_feb,      0, None),
+    "revision": (cmd_revision, 2, "Start date (YYYY-MM-DD) and number of days required."),
+    "build-resources": (cmd_build_resources, 0, None),
+    "update-cedict":   (cmd_update_cedict,   1, "Path of the new CEDICT release required."),
+}
+
+# raised by commands when they fail; main prints the message and doesn't save
+class CommandError(Exception):
+    pass
+
+# commands are matched by name, or for compatibility with older scripts, by these prefixes and
+# suffixes (genhtml, schedhtml, update_blacklist, ...)
+def find_command(name):
+    if name in COMMANDS:
+        return COMMANDS[name]
+    if name.startswith("gen") or name.startswith("sched"):
+        return COMMANDS["gen"]
+    if name.endswith("blacklist"):
+        return COMMANDS["blacklist"]
+    if name.endswith("feb"):
+        return COMMANDS["feb"]
+    return None
 
 ########
 # Main #
 ########
 
-# the database is saved if this function returns True
-def main(db):
+# the arguments are checked before anything is loaded, and the database is saved afterwards if
+# the command returns True
+def main(args):
     # default to generate if no arguments given
-    if len(sys.argv) < 2 or sys.argv[1].startswith("gen"):
-        # default to 30 chars
-        n_chars = int(sys.argv[2]) if len(sys.argv) >= 3 else 30
-        
-        gen = db.generate(n_chars)
-        
-        if sys.argv[1].endswith("html"):
-            # default to 10 boxes for writing characters
-            n_boxes = int(sys.argv[3]) if len(sys.argv) >= 4 else 10
-            # default to 2 pages
-            n_pages = int(sys.argv[4]) if len(sys.argv) >= 5 else 2
-        
-            return htmlgen.charsheet(gen, n_boxes, n_pages)
-        else:
-            print(gen)
-            return True
-
-    elif sys.argv[1] == "add":
-        if len(sys.argv) < 4:
-            print("Path of file to add and label for this file required.")
-            return False
-        return db.add_text(sys.argv[2], sys.argv[3])
-
-    elif sys.argv[1] == "summary":
-        return gen_summaries(db)
-    
-    elif sys.argv[1] == "dump":
-        print(db.__dict__)
-        return False # no need to save, we only dumped the db
-
-    elif sys.argv[1] == "mostfreq":
-        # print the list of characters and their frequency, sorted by frequency
-        # (blacklisted characters are skipped)
-        chars = []
-        for c, d in db.chars.items():
-            if c in db.blacklist:
-                continue
-            chars.append([c, d[TIMES_OCCURRED]])
-        chars.sort(key=lambda v: v[1], reverse=True)
-        for c in chars:
-            print(c[0], c[1])
-        return False
+    if len(args) < 1:
+        args = ["gen"]
 
-    elif sys.argv[1].endswith("blacklist"):
-        return db.update_blacklist()
-    
-    elif sys.argv[1].endswith("feb"):
-        return feb_revision(db)
-    
-    else:
+    command = find_command(args[0])
+    if not command:
         print("Invalid arguments.")
         return False
+    function, n_args, usage = command
+    if len(args) - 1 < n_args:
+        print(usage)
+        return False
+
+    with timings.phase("db_load"):
+        db = load()
+    if db is False:
+        return False # load_db already printed the error
+
+    try:
+        should_save = function(db, args)
+    except (CommandError, resources.ResourceError) as e:
+        print(e)
+        return False
+    if should_save:
+        with timings.phase("save"):
+            return save(db)
+    return False
+
+# the class given with --class, whose database is a shard of the shared corpus (see shards.py),
+# or None to use db.pickle
+class_name = None
+
+def load():
+    if class_name:
+        import shards
+        return shards.load_class(class_name)
+    return load_db()
+
+def save(db, raise_conflicts=False):
+    if class_name:
+        import shards
+        return shards.save_class(db, class_name, raise_conflicts=raise_conflicts)
+    return save_db(db, raise_conflicts=raise_conflicts)
+
+# removes global options from sys.argv and returns them as a dict of name -> value.
+# they can appear anywhere on the command line:
+#   --timings[=path]  write a JSON report of how long each phase took (to stderr by default)
+#   --profile[=path]  dump cProfile stats for the whole run (to main.prof by default)
+#   --class=name      use the database of a class sharing the corpus with other classes
+def parse_global_options():
+    defaults = {"--timings": None, "--profile": "main.prof", "--class": None}
+    options = dict()
+    for arg in sys.argv[1:]:
+        name, _, value = arg.partition('=')
+        if name in defaults:
+            options[name[2:]] = value or defaults[name]
+            sys.argv.remove(arg)
+    return options
 
 if __name__ == "__main__":
-    db = load_db()
-    if main(db):
-        save_db(db)
+    options = parse_global_options()
+    class_name = options.get("class")
+
+    if "profile" in options:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    main(sys.argv[1:])
+
+    if "profile" in options:
+        profiler.disable()
+        profiler.dump_stats(options["profile"])
+    if "timings" in options:
+        timings.write(options["timings"], sys.argv[1:])
@@ -9,6 +9,9 @@
 # Y: vowel/diphthong/final (includes w/y next to bare vowel so they will be scored close)
 # Z: tone (neutral is zero, rest are 1,2,3,4 as normal
 
+import math
+import unicodedata
+
 CONSONANT_TABLE = {
     'NONE': 0,
     'b': 1,'p': 2,'m': 3,'f': 4,
@@ -119,3 +122,19 @@ def pinyin2coords(pinyin):
 def coord_distance(x,y):
     # euclidean distance
     return math.sqrt(sum([(a-b)*(a-b) for a,b in zip(x,y)]))
+
+# syllable2coord coordinate scaled by the *_WEIGHT values, for comparing with coord_distance
+def weigh_coord(coord):
+    vowelfinal, initial, tone = coord
+    return [vowelfinal * VOWEL_WEIGHT, initial * CONSONANT_WEIGHT, tone * TONE_WEIGHT]
+
+# pinyin.json syllable (accented with the tone number after a space, e.g. 'shì 4') to the
+# numbered format used by CEDICT and syllable2coord, e.g. 'shi4'
+def accented2numbered(syllable):
+    letters, _, tone = syllable.partition(' ')
+    letters = letters.replace('ü', 'u:').replace('ǖ', 'u:').replace('ǘ', 'u:')
+    letters = letters.replace('ǚ', 'u:').replace('ǜ', 'u:')
+    # remove the tone marks, which are combining characters after NFD normalisation
+    letters = "".join(c for c in unicodedata.normalize('NFD', letters)
+                      if not unicodedata.combining(c))
+    return letters + tone
@@ -0,0 +1,82 @@
+from charhandling import *
+import cedict
+from cedict2pinyin import add_accents
+
+# Readings of heteronyms (characters with more than one reading, like 行 xíng/háng or 长
+# cháng/zhǎng) as they're used in our own material.
+#
+# pinyin.json ranks the readings of each character by how many CEDICT words use them, which is a
+# good guess in general, but handouts for one topic can lean the other way (a lesson about banks
+# has a lot more 银行 than 行人). So when text is added with `main.py add ... --readings`, it's
+# split into words by forward maximum matching against CEDICT (at each position take the longest
+# word starting there), and the reading each word gives its characters is counted in
+# db.readings:
+#   char -> dict of accented reading -> number of times it was read that way
+# Only words with a single reading in CEDICT are used, as otherwise it's unknown which was meant,
+# and only heteronyms are counted, as the others have nothing to choose between.
+#
+# prefer() then puts the reading counted most often first, which is the one charsheet shows.
+
+MAX_WORD_LENGTH = 8
+
+class Segmenter:
+    def __init__(self, defs):
+        self.readings = dict() # word -> tuple of the accented reading of each of its characters
+        self.lengths  = dict() # first character -> lengths of the words starting with it, longest first
+        char_readings = dict()
+
+        for word, entries in defs.items():
+            if len(word) > MAX_WORD_LENGTH or not all(map(is_hanzi, word)):
+                continue
+            pinyins = {entry[cedict.PINYIN_INDEX].lower() for entry in entries}
+            if len(pinyins) != 1:
+                for pinyin in pinyins: # still counts towards which characters are heteronyms
+                    for c, syllable in zip(word, pinyin.split()):
+                        char_readings.setdefault(c, set()).add(add_accents(syllable))
+                continue # ambiguous
+            syllables = pinyins.pop().split()
+            if len(syllables) != len(word):
+                continue
+            self.readings[word] = tuple(map(add_accents, syllables))
+            self.lengths.setdefault(word[0], set()).add(len(word))
+            for c, reading in zip(word, self.readings[word]):
+                char_readings.setdefault(c, set()).add(reading)
+
+        self.lengths = {c: sorted(lengths, reverse=True) for c, lengths in self.lengths.items()}
+        self.heteronyms = {c for c, readings in char_readings.items() if len(readings) > 1}
+
+    # the words of text, in order. Characters that don't start a known word are skipped.
+    def segment(self, text):
+        i, n = 0, len(text)
+        while i < n:
+            for length in self.lengths.get(text[i], ()):
+                word = text[i:i + length]
+                if word in self.readings:
+                    yield word
+                    i += length
+                    break
+            else:
+                i += 1
+
+    # add the readings of the heteronyms in text to counts (char -> reading -> count)
+    def count(self, text, counts):
+        heteronyms = self.heteronyms
+        for word in self.segment(text):
+            for c, reading in zip(word, self.readings[word]):
+                if c in heteronyms:
+                    char_counts = counts.setdefault(c, dict())
+                    char_counts[reading] = char_counts.get(reading, 0) + 1
+
+# pinyin.json entries of chars with the readings in counts moved to the front, most often read
+# first. Readings that weren't counted keep the CEDICT ranking behind them.
+def prefer(pinyin, counts, chars):
+    ranked = dict()
+    for c in chars:
+        readings = pinyin.get(c)
+        if readings is None:
+            continue
+        char_counts = counts.get(c)
+        if char_counts:
+            readings = sorted(readings, key=lambda r: char_counts.get(r, 0), reverse=True)
+        ranked[c] = readings
+    return ranked
@@ -0,0 +1,274 @@
+import os
+import json
+import mmap
+import pickle
+import hashlib
+
+import cedict
+
+# Shared reference data (CEDICT, the pinyin table, the CEDICT word segmenter, radicals, the
+# character search index and the Source Han Serif variation tables).
+#
+#   main.py build-resources       compiles everything into resources.bundle
+#   main.py update-cedict path    installs a new CEDICT release, only redoing what changed
+#
+# Every dataset is built from its source files into a section of one bundle file, so loading
+# one is a single unpickle instead of parsing CEDICT or rads.json:
+#   8 bytes   MAGIC
+#   8 bytes   length of the header, little-endian
+#   header    JSON: {"version":  BUNDLE_VERSION,
+#                    "sources":  {source: {"path", "size", "mtime_ns", "sha256"}},
+#                    "sections": {section: [offset, length]}}
+#   sections  each a pickle, at offset bytes after the end of the header
+# The bundle is memory mapped, and a section is only unpickled the first time it's used.
+#
+# When the bundle is opened, each source that still exists is checked against the header (its
+# size and modification time, and the SHA256 if those changed), and StaleBundle is raised if one
+# has changed, rather than silently using old data. Without a bundle, sections are built from the
+# sources directly, which is slower but works the same. Sections whose sources didn't exist at
+# build time (e.g. the font tables) are left out of the bundle, and also built from the sources
+# if they're used.
+#
+# The manager (get()) and the sections it loaded are shared by everything in the process, so the
+# server and batch jobs only load each dataset once. Callers must treat them as read-only.
+#
+# Loading fails with ResourceError, e.g. if a source file is missing.
+
+BUNDLE_PATH    = "resources.bundle"
+BUNDLE_VERSION = 1 # increase when a section's format changes
+MAGIC          = b"HZRSRC01"
+
+SOURCES = {
+    "cedict":  cedict.DEFAULT_PATH,
+    "rads":    "rads.json",
+    "ivs":     "SourceHanSerif_JP_sequences.txt",
+    "cmap_cn": "UniSourceHanSerifCN-UTF32-H",
+    "cmap_jp": "UniSourceHanSerifJP-UTF32-H",
+}
+
+class ResourceError(Exception):
+    pass
+
+class StaleBundle(ResourceError):
+    pass
+
+# section builders, given the manager (for source paths and other sections)
+def build_cedict(res):
+    return cedict.load(res.source_path("cedict"))
+
+def build_pinyin(res):
+    import cedict2pinyin
+    return cedict2pinyin.build(res.get("cedict"))
+
+def build_segmenter(res):
+    import readings
+    return readings.Segmenter(res.get("cedict"))
+
+def build_radicals(res):
+    import radicals
+    return radicals.load_from_json(res.source_path("rads"))
+
+def build_search_index(res):
+    import charsearch
+    return charsearch.SearchIndex.from_radicals(res.get("radicals"))
+
+def build_ivs(res):
+    import font_variations
+    return font_variations.process_ivs_file(res.source_path("ivs"))
+
+def build_cmap(source):
+    def build(res):
+        import font_variations
+        return font_variations.process_cmap_file(res.source_path(source))
+    return build
+
+# section -> (sources it's built from, builder)
+SECTIONS = {
+    "cedict":    (("cedict",),  build_cedict),
+    "pinyin":    (("cedict",),  build_pinyin),
+    "segmenter": (("cedict",),  build_segmenter),
+    "radicals":  (("rads",),    build_radicals),
+    "search":    (("rads",),    build_search_index),
+    "ivs":       (("ivs",),     build_ivs),
+    "cmap_cn":   (("cmap_cn",), build_cmap("cmap_cn")),
+    "cmap_jp":   (("cmap_jp",), build_cmap("cmap_jp")),
+}
+
+# SHA256 of a file as a hex string
+def hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+# path=None never uses a bundle
+class Resources:
+    def __init__(self, path=BUNDLE_PATH, sources=SOURCES):
+        self.path    = path
+        self.sources = sources
+        self.loaded  = dict() # section -> data
+        self.header  = None   # of the bundle, once opened
+        self.map     = None   # mmap of the bundle, or None if there isn't one
+
+    def source_path(self, source):
+        path = self.sources[source]
+        if not os.path.isfile(path):
+            raise ResourceError("{} not found (needed for {})".format(path, source))
+        return path
+
+    # open the bundle if it hasn't been opened yet and check it's up to date
+    def open(self):
+        if self.header is not None:
+            return
+        if self.path is None or not os.path.isfile(self.path):
+            self.header = {"sources": {}, "sections": {}}
+            return
+
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ResourceError("{} is not a resource bundle".format(self.path))
+        length = int.from_bytes(self.map[8:16], 'little')
+        header = json.loads(self.map[16:16 + length])
+        self.data_offset = 16 + length
+
+        if header["version"] != BUNDLE_VERSION:
+            raise StaleBundle("{} is from another version, run build-resources".format(self.path))
+        for source, stamp in header["sources"].items():
+            path = self.sources.get(source, stamp["path"])
+            if not os.path.isfile(path):
+                continue # only the bundle was installed
+            stat = os.stat(path)
+            if (stat.st_size, stat.st_mtime_ns) == (stamp["size"], stamp["mtime_ns"]):
+                continue
+            if hash_file(path) != stamp["sha256"]:
+                raise StaleBundle("{} changed since {} was built, run build-resources".format(
+                    path, self.path))
+        self.header = header
+
+    # SHA256 of a source file, from the bundle header if only the bundle was installed
+    def source_hash(self, source):
+        path = self.sources[source]
+        if os.path.isfile(path):
+            return hash_file(path)
+        self.open()
+        if source not in self.header["sources"]:
+            raise ResourceError("{} not found (needed for {})".format(path, source))
+        return self.header["sources"][source]["sha256"]
+
+    def get(self, section):
+        if section not in self.loaded:
+            self.open()
+            if section in self.header["sections"]:
+                offset, length = self.header["sections"][section]
+                start = self.data_offset + offset
+                with memoryview(self.map) as view, view[start:start + length] as data:
+                    self.loaded[section] = pickle.loads(data)
+            else:
+                self.loaded[section] = SECTIONS[section][1](self)
+        return self.loaded[section]
+
+    # write the bundle again with sections (section -> data) replaced, stamped with their sources
+    # as they are now. The other sections are copied across without unpickling them.
+    def patch(self, sections):
+        self.open()
+        stamps = dict(self.header["sources"])
+        pickled = dict()
+        for section in SECTIONS:
+            if section in sections:
+                pickled[section] = pickle.dumps(sections[section], protocol=pickle.HIGHEST_PROTOCOL)
+                for source in SECTIONS[section][0]:
+                    stamps[source] = stamp(self.sources[source])
+            elif section in self.header["sections"]:
+                offset, length = self.header["sections"][section]
+                start = self.data_offset + offset
+                pickled[section] = self.map[start:start + length]
+
+        write_bundle(self.path, stamps, pickled)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.loaded = dict()
+        self.header = None
+        self.map    = None
+
+# the header entry of a source file
+def stamp(path):
+    stat = os.stat(path)
+    return {"path":     path,
+            "size":     stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256":   hash_file(path)}
+
+# write a bundle of pickled sections (section -> bytes) built from the stamped sources
+def write_bundle(path, stamps, pickled):
+    import sitebuild
+
+    sections = dict()
+    offset = 0
+    for section, data in pickled.items():
+        sections[section] = [offset, len(data)]
+        offset += len(data)
+
+    header = json.dumps({"version": BUNDLE_VERSION, "sources": stamps, "sections": sections})
+    header = header.encode('utf-8')
+    sitebuild.write_atomic(path, b"".join([MAGIC, len(header).to_bytes(8, 'little'), header]
+                                          + list(pickled.values())))
+
+# build a bundle of every section whose sources exist, returning the names of the sections
+def build(path=BUNDLE_PATH, sources=SOURCES):
+    res = Resources(None, sources)
+    stamps = dict()
+    pickled = dict()
+    for section, (section_sources, builder) in SECTIONS.items():
+        if not all(os.path.isfile(sources[source]) for source in section_sources):
+            print("Skipping {}: {} not found".format(section,
+                  ", ".join(sources[source] for source in section_sources)))
+            continue
+        for source in section_sources:
+            if source not in stamps:
+                stamps[source] = stamp(sources[source])
+        pickled[section] = pickle.dumps(res.get(section), protocol=pickle.HIGHEST_PROTOCOL)
+
+    write_bundle(path, stamps, pickled)
+    return list(pickled)
+
+resources = None
+
+# the shared manager, opened the first time it's needed
+def get():
+    global resources
+    if resources is None:
+        resources = Resources()
+    return resources
+
+def load_pinyin():
+    return get().get("pinyin")
+
+def load_cedict():
+    return get().get("cedict")
+
+def load_segmenter():
+    return get().get("segmenter")
+
+def load_radicals():
+    return get().get("radicals")
+
+def load_search_index():
+    return get().get("search")
+
+def load_ivs():
+    return get().get("ivs")
+
+# region is "cn" or "jp"
+def load_cmap(region):
+    return get().get("cmap_" + region)
+
+# forget everything loaded so far, e.g. after the files were rebuilt
+def clear():
+    global resources
+    if resources is not None:
+        resources.close()
+    resources = None
@@ -0,0 +1,152 @@
+import heapq
+
+from database import TIMES_OCCURRED, TIMES_USED, LAST_USED
+
+# Due-date based spaced repetition scheduler, as an alternative to Database.generate.
+#
+# Instead of scoring every character on every cycle, each character is given a due cycle and kept
+# in a heap ordered by:
+#   (due_cycle, -times_occurred, sequence number)
+# where the sequence number counts up with every entry pushed, so ties go to the character that
+# was scheduled first (and entries never compare their chars). Selecting a sheet is just popping
+# the first n entries, O(k log n).
+#
+# Intervals follow SM-2 without grading (we don't know how well a character was written, only
+# that it was practised):
+#   I(1) = FIRST_INTERVAL
+#   I(2) = SECOND_INTERVAL
+#   I(n) = I(n-1) * EASE
+# where n is times_used after the selection. Because the interval only depends on times_used,
+# due dates can be reconstructed from the existing TIMES_USED/LAST_USED columns.
+#
+# Characters that have never been used are due on the cycle they were added, so they come before
+# any review that is due later (this replaces the `since_last *= 16` hack in generate).
+#
+# Entries are never removed from the middle of the heap. Instead the entry list is marked as
+# REMOVED and skipped when popped (see the heapq documentation, "Priority Queue Implementation
+# Notes"). Every reschedule leaves one of these behind, so once they outnumber the live entries
+# the heap is rebuilt without them.
+
+FIRST_INTERVAL  = 1
+SECOND_INTERVAL = 6
+EASE            = 2.5
+
+# index of the char in a heap entry ([due, -occurred, sequence, char]), set to REMOVED when the
+# entry is superseded
+ENTRY_CHAR_INDEX = 3
+REMOVED = None
+
+# the heap isn't compacted while it's this small
+MIN_COMPACT_SIZE = 64
+
+class Scheduler:
+    def __init__(self,
+                 first_interval=FIRST_INTERVAL,
+                 second_interval=SECOND_INTERVAL,
+                 ease=EASE):
+        self.first_interval  = first_interval
+        self.second_interval = second_interval
+        self.ease            = ease
+        self.heap            = []
+        self.entries         = dict() # char -> heap entry
+        self.sequence        = 0      # of the next entry pushed
+
+    # create a scheduler from the usage columns of an existing database
+    @classmethod
+    def from_database(cls, db, **params):
+        sched = cls(**params)
+        # in character order, so ties are broken the same way every time it's rebuilt
+        for c in sorted(db.chars):
+            if c in db.blacklist:
+                continue # blacklisted characters are never scheduled
+            d = db.chars[c]
+            if d[TIMES_USED] > 0:
+                due = d[LAST_USED] + sched.interval(d[TIMES_USED])
+            else:
+                due = 0 # never used, so it's been due since the start
+            sched.entries[c] = sched.entry(c, due, d[TIMES_OCCURRED])
+        sched.rebuild()
+        return sched
+
+    # schedulers pickled by older versions have [due, -occurred, char] entries without sequence
+    # numbers, so their live entries are given one and the heap is rebuilt
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not hasattr(self, "sequence"):
+            self.sequence = 0
+            live = sorted(self.entries.values())
+            self.entries = dict()
+            for due, occurred, c in live:
+                self.entries[c] = self.entry(c, due, -occurred)
+            self.rebuild()
+
+    def entry(self, c, due, occurred):
+        entry = [due, -occurred, self.sequence, c]
+        self.sequence += 1
+        return entry
+
+    # make the heap from the live entries only. building it in one go is O(n), rather than
+    # O(n log n) for repeated pushes
+    def rebuild(self):
+        self.heap = list(self.entries.values())
+        heapq.heapify(self.heap)
+
+    # number of cycles until a character that has been used 'times_used' times is due again
+    def interval(self, times_used):
+        if times_used <= 1:
+            return self.first_interval
+        return max(1, round(self.second_interval * self.ease ** (times_used - 2)))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, c):
+        return c in self.entries
+
+    # returns the cycle a character is due on, or None if it isn't scheduled
+    def due(self, c):
+        entry = self.entries.get(c)
+        return entry[0] if entry else None
+
+    # (re)schedule a character to be due on the given cycle
+    def push(self, c, due, occurred=0):
+        self.remove(c)
+        entry = self.entry(c, due, occurred)
+        self.entries[c] = entry
+        heapq.heappush(self.heap, entry)
+
+    # stop scheduling a character. Its heap entry is left in place but marked as removed, until
+    # there are more removed entries than live ones.
+    def remove(self, c):
+        entry = self.entries.pop(c, None)
+        if entry:
+            entry[ENTRY_CHAR_INDEX] = REMOVED
+            if len(self.heap) > MIN_COMPACT_SIZE and len(self.heap) > 2 * len(self.entries):
+                self.rebuild()
+
+    # add a character that isn't scheduled yet, due immediately
+    def add(self, db, c):
+        if c not in self.entries and c not in db.blacklist:
+            self.push(c, db.cycle, db.chars[c][TIMES_OCCURRED])
+
+    # called after a character was selected on the current cycle (by any generator) and its
+    # usage info in the db was updated
+    def selected(self, db, c):
+        d = db.chars[c]
+        self.push(c, db.cycle + self.interval(d[TIMES_USED]), d[TIMES_OCCURRED])
+
+    # pop up to n characters in due order, skipping any that have since been blacklisted.
+    # the characters are not rescheduled here; that happens via selected() once the caller has
+    # updated their usage info.
+    def pop(self, db, n):
+        output = []
+        while self.heap and len(output) < n:
+            entry = heapq.heappop(self.heap)
+            c = entry[ENTRY_CHAR_INDEX]
+            if c is REMOVED:
+                continue
+            del self.entries[c]
+            if c in db.blacklist:
+                continue # dropped; update_blacklist re-adds it if it's un-blacklisted
+            output.append(c)
+        return output
@@ -0,0 +1,321 @@
+import io
+import json
+import asyncio
+import urllib.parse
+
+import htmlgen
+import radicals
+import readings
+import resources
+from sheetcache import SheetCache
+from database import save_db, MergeConflict
+from timings import timings
+
+# Local HTTP server that keeps the database and reference data loaded between requests.
+#
+#   main.py serve [port]
+#
+# Only listens on localhost, and only answers requests addressed to localhost (by the Host header)
+# that don't come from another site's page (by the Origin header), so a web page can't use it
+# through the browser or DNS rebinding. Endpoints (parameters are in the query string):
+#
+#   POST /generate    n=30 [mode=sched] [labels=L1,L2]     JSON list of selected characters
+#   POST /charsheet   n=30 boxes=10 pages=2 [mode=sched] [labels=] [title= date=]
+#                                                          generates, then renders a sheet
+#   GET  /charsheet   chars=字词 boxes=10 pages=2 [title= date=]
+#                                                          renders a sheet for given characters
+#   GET  /summary     words=词语,汉字 or label=<label>      HTML summary of the words
+#   GET  /similar     char=字 [distance=2]                 JSON list of [char, distance]
+#   GET  /search      components=氵 [strokes=8-10] [type=⿰] [all=1]
+#                                                          JSON list of characters (see
+#                                                          charsearch.py), in the database unless
+#                                                          all=1
+#   GET  /status                                          JSON info about the database
+#
+# Requests that modify the database (POST) are queued and run one at a time by a single writer
+# task; GET requests only read, and as everything runs on one event loop they always see a
+# consistent database. After a write the database is saved once no other write has happened for
+# FLUSH_DELAY seconds, and on shutdown if there are unsaved changes. If another run saved a
+# conflicting change in the meantime, the server stops without saving, as the selections it
+# already returned can't be taken back.
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8020
+FLUSH_DELAY = 5 # seconds
+
+MAX_REQUEST_LINE = 8192
+MAX_HEADERS      = 100
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "[::1]")
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+class Server:
+    def __init__(self, db, save=save_db):
+        self.db      = db
+        self.save    = save
+        self.dirty   = False
+        self.queue   = None # created in run(), as it needs the event loop
+        self.flush_handle = None
+        self.server  = None  # the asyncio server, while running
+        self.stopped = False # by a conflict when saving
+        self.sheet_cache  = SheetCache()
+
+        self.routes = {
+            ("POST", "/generate"):  self.post_generate,
+            ("POST", "/charsheet"): self.post_charsheet,
+            ("GET",  "/charsheet"): self.get_charsheet,
+            ("GET",  "/summary"):   self.get_summary,
+            ("GET",  "/similar"):   self.get_similar,
+            ("GET",  "/search"):    self.get_search,
+            ("GET",  "/status"):    self.get_status,
+        }
+
+    ##########
+    # Writes #
+    ##########
+
+    # queue a function to be called with the database by the writer task, and wait for its result
+    async def write(self, function):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((function, future))
+        return await future
+
+    async def writer(self):
+        while True:
+            function, future = await self.queue.get()
+            try:
+                result = function(self.db)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+                if function != self.flush:
+                    self.dirty = True
+                    self.schedule_flush()
+
+    # (re)start the debounce timer for saving the database
+    def schedule_flush(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self.flush_handle = loop.call_later(
+            FLUSH_DELAY, lambda: self.queue.put_nowait((self.flush, loop.create_future())))
+
+    def flush(self, db):
+        if self.dirty:
+            with timings.phase("save"):
+                try:
+                    saved = self.save(db, raise_conflicts=True)
+                except MergeConflict as e:
+                    print("Another run made a conflicting change ({}), stopping without "
+                          "saving".format(e))
+                    self.dirty = False
+                    self.stopped = True
+                    self.server.close()
+                    return
+                if saved:
+                    self.dirty = False
+                    print("Saved database")
+
+    def generate(self, query):
+        n_chars = int_arg(query, "n", 30)
+        labels  = query["labels"].split(',') if query.get("labels") else None
+        if labels and query.get("mode") == "sched":
+            raise HTTPError(400, "labels can't be used with mode=sched")
+        def function(db):
+            with timings.phase("generate"):
+                if query.get("mode") == "sched":
+                    return db.schedule(n_chars)
+                return db.generate(n_chars, labels=labels)
+        return self.write(function)
+
+    #############
+    # Endpoints #
+    #############
+
+    async def post_generate(self, query):
+        chars = await self.generate(query)
+        return json_response(chars)
+
+    async def post_charsheet(self, query):
+        chars = await self.generate(query)
+        return self.render_charsheet(chars, query)
+
+    async def get_charsheet(self, query):
+        chars = query.get("chars")
+        if not chars:
+            raise HTTPError(400, "chars is required")
+        return self.render_charsheet(list(chars), query)
+
+    def render_charsheet(self, chars, query):
+        f = io.StringIO()
+        kwargs = {k: query[k] for k in ("title", "date") if k in query}
+        with timings.phase("render"):
+            pinyin = readings.prefer(resources.load_pinyin(), self.db.readings, chars)
+            self.sheet_cache.charsheet(chars, int_arg(query, "boxes", 10),
+                                       int_arg(query, "pages", 2), pinyin, f, **kwargs)
+        return html_response(f.getvalue())
+
+    async def get_summary(self, query):
+        if "label" in query:
+            words = self.db.label_index().lesson_chars(query["label"])
+            title = "Summary for " + query["label"]
+        elif "words" in query:
+            words = query["words"].split(',')
+            title = "Summary"
+        else:
+            raise HTTPError(400, "words or label is required")
+        f = io.StringIO()
+        with timings.phase("render"):
+            htmlgen.summary(words, resources.load_cedict(), f, title)
+        return html_response(f.getvalue())
+
+    async def get_similar(self, query):
+        char = query.get("char")
+        rads = resources.load_radicals()
+        if not char or char not in rads:
+            raise HTTPError(400, "char is required and must be in the radicals data")
+        distance = float(query.get("distance", 2))
+        return json_response(list(radicals.characters_within(rads, char, distance)))
+
+    async def get_search(self, query):
+        import numpy as np
+
+        strokes = None
+        if "strokes" in query:
+            first, _, last = query["strokes"].partition("-")
+            strokes = (int(first), int(last or first))
+        chars = None
+        if query.get("all") != "1":
+            chars = np.fromiter(map(ord, self.db.chars), np.uint32, len(self.db.chars))
+            chars = chars[~self.db.blacklist.mask(chars)]
+        found = resources.load_search_index().search(list(query.get("components", "")), strokes,
+                                                     query.get("type"), chars)
+        return json_response("".join(map(chr, found)))
+
+    async def get_status(self, query):
+        return json_response({
+            "cycle":     self.db.cycle,
+            "chars":     len(self.db.chars),
+            "blacklist": len(self.db.blacklist),
+            "unsaved":   self.dirty,
+            "queued":    self.queue.qsize(),
+        })
+
+    ########
+    # HTTP #
+    ########
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, target, headers = await read_request(reader)
+                check_local(headers)
+                url = urllib.parse.urlsplit(target)
+                query = dict(urllib.parse.parse_qsl(url.query))
+                route = self.routes.get((method, url.path))
+                if not route:
+                    if any(path == url.path for _, path in self.routes):
+                        raise HTTPError(405, "method not allowed")
+                    raise HTTPError(404, "not found")
+                status, content_type, body = 200, *await route(query)
+            except HTTPError as e:
+                status, content_type, body = e.status, "text/plain", str(e)
+            except (ValueError, KeyError) as e:
+                status, content_type, body = 400, "text/plain", "bad request: {}".format(e)
+            except (OSError, resources.ResourceError) as e:
+                # most likely a data file that isn't there (e.g. rads.json) or a stale bundle
+                status, content_type, body = 503, "text/plain", "unavailable: {}".format(e)
+            except Exception as e:
+                print("Error handling request:", repr(e))
+                status, content_type, body = 500, "text/plain", "internal error"
+
+            body = body.encode('utf-8')
+            writer.write("HTTP/1.1 {} {}\r\nContent-Type: {}; charset=utf-8\r\n"
+                         "Content-Length: {}\r\nConnection: close\r\n\r\n".format(
+                             status, REASONS[status], content_type, len(body)).encode('ascii'))
+            writer.write(body)
+            await writer.drain()
+        except ConnectionError:
+            pass # client went away
+        finally:
+            writer.close()
+
+    async def run(self, port=DEFAULT_PORT):
+        self.queue = asyncio.Queue()
+        writer_task = asyncio.create_task(self.writer())
+
+        self.server = await asyncio.start_server(self.handle, HOST, port)
+        print("Serving on http://{}:{}/".format(HOST, port))
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        except asyncio.CancelledError:
+            if not self.stopped:
+                raise
+        finally:
+            writer_task.cancel()
+            self.flush(self.db) # nothing else can be writing now
+
+# read the request line and headers, returning (method, target, headers) with the header names
+# in lower case. the body is ignored.
+async def read_request(reader):
+    line = await reader.readline()
+    if len(line) > MAX_REQUEST_LINE or not line.endswith(b"\n"):
+        raise HTTPError(400, "bad request line")
+    parts = line.decode('utf-8', 'replace').split()
+    if len(parts) != 3:
+        raise HTTPError(400, "bad request line")
+
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(line) > MAX_REQUEST_LINE or len(headers) >= MAX_HEADERS:
+            raise HTTPError(400, "bad headers")
+        name, sep, value = line.decode('latin-1').partition(":")
+        if not sep:
+            raise HTTPError(400, "bad header")
+        headers[name.strip().lower()] = value.strip()
+    return parts[0], parts[1], headers
+
+# the host of a Host header or an origin, without the port
+def host_name(host):
+    if host.startswith("["): # IPv6 address
+        return host[:host.find("]") + 1]
+    return host.partition(":")[0]
+
+def check_local(headers):
+    if host_name(headers.get("host", "")).lower() not in LOCAL_HOSTS:
+        raise HTTPError(403, "only requests to localhost are answered")
+    origin = headers.get("origin")
+    if origin is not None:
+        scheme, _, host = origin.partition("://")
+        if scheme not in ("http", "https") or host_name(host).lower() not in LOCAL_HOSTS:
+            raise HTTPError(403, "cross-origin requests are not allowed")
+
+def int_arg(query, name, default):
+    return int(query.get(name, default))
+
+def json_response(value):
+    return "application/json", json.dumps(value, ensure_ascii=False)
+
+def html_response(html):
+    return "text/html", html
+
+def main(db, args, save=save_db):
+    port = int(args[0]) if len(args) else DEFAULT_PORT
+    try:
+        asyncio.run(Server(db, save).run(port))
+    except KeyboardInterrupt:
+        print("Stopped")
+    return False # the server saves the database itself
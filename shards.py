@@ -0,0 +1,149 @@
+import os
+import pickle
+
+from database import (Database, CharStats, DB_PATH, load_db, save_file, read_file, locked, merged,
+                      MergeConflict)
+import blacklist
+
+# Databases for several classes that share one corpus.
+#
+#   main.py --class=NAME <command> ...
+#
+# The characters and how often they occur only depend on the handouts, which are the same for
+# every class, while what has been practised depends on the class. So instead of a db.pickle per
+# class, the database is split in two:
+#   corpus.pickle         shared: times_occurred of each character, first_seen, max_occurrences,
+#                         input_hashes and readings
+#   classes/NAME.pickle   one per class: cycle, max_used, times_used and last_used of the
+#                         characters the class has practised, blacklists and scheduler
+# Loading a class joins its shard with the corpus into a normal Database, so every command works
+# the same, and saving splits it again. A handout added with any class is in the corpus for all
+# of them. The corpus is only written if it changed, so commands that only generate don't
+# rewrite it.
+#
+# The first time a class is used without a corpus, the corpus is made from db.pickle (if there
+# is one), so an existing database can be shared by starting to use classes.
+
+CORPUS_PATH = "corpus.pickle"
+CLASSES_DIR = "classes"
+
+def shard_path(name):
+    return os.path.join(CLASSES_DIR, name + ".pickle")
+
+# split a database into (corpus, shard) dicts. Characters are stored as columns, like
+# Database.__getstate__ does. The shard only has usage of characters that have been used.
+def split(db):
+    corpus = {
+        "chars":           ("".join(db.chars), [d.times_occurred for d in db.chars.values()]),
+        "first_seen":      db.first_seen,
+        "max_occurrences": db.max_occurrences,
+        "input_hashes":    db.input_hashes,
+        "readings":        db.readings,
+    }
+
+    used = [(c, d) for c, d in db.chars.items() if d.times_used or d.last_used]
+    shard = {
+        "cycle":      db.cycle,
+        "max_used":   db.max_used,
+        "usage":      ("".join(c for c, _ in used),
+                       [d.times_used for _, d in used],
+                       [d.last_used  for _, d in used]),
+        "blacklists": db.blacklists,
+        "scheduler":  db.scheduler,
+    }
+    return corpus, shard
+
+def join(corpus, shard):
+    db = Database()
+
+    keys, used, last = shard["usage"]
+    usage = dict(zip(keys, zip(used, last)))
+    keys, occurred = corpus["chars"]
+    db.chars = {c: CharStats(occ, *usage.get(c, (0, 0))) for c, occ in zip(keys, occurred)}
+
+    db.first_seen      = corpus["first_seen"]
+    db.max_occurrences = corpus["max_occurrences"]
+    db.input_hashes    = corpus["input_hashes"]
+    db.readings        = corpus.get("readings", {}) # not in corpora from before readings
+    db.cycle           = shard["cycle"]
+    db.max_used        = shard["max_used"]
+    db.blacklists      = shard["blacklists"]
+    db.blacklist       = blacklist.combine(db.blacklists.values())
+    db.scheduler       = shard["scheduler"]
+
+    if db.scheduler is not None:
+        # characters added to the corpus while using another class aren't scheduled yet
+        for c in db.chars:
+            if c not in db.scheduler:
+                db.scheduler.add(db, c)
+
+    return db
+
+# the database of the files' contents (either can be None if the file doesn't exist yet)
+def join_files(corpus_data, shard_data):
+    empty_corpus, empty_shard = split(Database())
+    corpus = pickle.loads(corpus_data) if corpus_data else empty_corpus
+    shard  = pickle.loads(shard_data)  if shard_data  else empty_shard
+    return join(corpus, shard)
+
+# load the database of a class, or False on failure.
+# locking, saving and merging work like load_db and save_db, with the lock on the corpus.
+def load_class(name, corpus_path=CORPUS_PATH):
+    try:
+        with locked(corpus_path, shared=True):
+            corpus_data = read_file(corpus_path)
+            shard_data  = read_file(shard_path(name))
+
+        db = join_files(corpus_data, shard_data)
+        if corpus_data is None:
+            if os.path.isfile(DB_PATH):
+                print("Corpus file does not exist, using the corpus of", DB_PATH)
+                db_pickle = load_db(DB_PATH)
+                if db_pickle is False:
+                    return False
+                db = join(split(db_pickle)[0], split(db)[1])
+            else:
+                print("Corpus file does not exist, using empty corpus.")
+        if shard_data is None:
+            print("Class '{}' does not exist yet, starting with no usage.".format(name))
+    except Exception as e:
+        print("Failed to load database:", e)
+        return False
+
+    db._base = (corpus_data, shard_data)
+    return db
+
+# conflicts are handled like in save_db
+def save_class(db, name, corpus_path=CORPUS_PATH, raise_conflicts=False):
+    path = shard_path(name)
+    try:
+        with locked(corpus_path):
+            current = (read_file(corpus_path), read_file(path))
+            base = getattr(db, "_base", (None, None))
+            result = db
+            if current != base:
+                print("Database was changed by another run, merging")
+                result = merged(join_files(*base), db, join_files(*current))
+
+            corpus, shard = split(result)
+            corpus_data, shard_data = pickle.dumps(corpus), pickle.dumps(shard)
+            # the corpus is shared, so only write it if it changed
+            if corpus_data != current[0] and not save_file(corpus_path, corpus_data):
+                return False
+            if not os.path.isdir(CLASSES_DIR):
+                os.mkdir(CLASSES_DIR)
+            if not save_file(path, shard_data):
+                return False
+    except MergeConflict as e:
+        if raise_conflicts:
+            raise
+        print("Failed to save database:", e)
+        return False
+    except OSError as e:
+        print("Failed to save database:", e)
+        return False
+
+    if result is not db:
+        db.__dict__.update(result.__dict__)
+    db._base = (corpus_data, shard_data)
+    return True
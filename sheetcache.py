@@ -0,0 +1,125 @@
+import os
+import io
+import sys
+import json
+import shutil
+import hashlib
+import datetime
+
+import htmlgen
+import sitebuild
+
+# Cache of rendered character sheets (htmlgen.charsheet), kept between runs.
+#
+# Re-prints, regenerated packs and the extras sheet often have exactly the same contents as an
+# earlier sheet, so each rendered sheet is stored under the SHA256 of everything that goes into
+# it: the characters, box and page counts, title, date, the pinyin shown for each character and
+# htmlgen.TEMPLATE_VERSION. As the key covers all of the inputs, entries never need invalidating.
+#
+# The cache is limited to max_bytes. Using an entry updates its modification time, and when the
+# cache gets too big the least recently used entries are deleted.
+
+CACHE_DIR = os.path.join("cache", "sheets")
+MAX_BYTES = 64 << 20
+
+class SheetCache:
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.path      = path
+        self.max_bytes = max_bytes
+        self.size      = None # total size of the entries, found when first needed
+        self.hits      = 0
+        self.misses    = 0
+
+    def key(self, chars, n_boxes, n_pages, pinyin=None, title=htmlgen.CHARSHEET_TITLE, date=None):
+        # the same default date as htmlgen.charsheet
+        if date is None:
+            date = datetime.date.today().isoformat()
+        readings = [pinyin[c][0] if c in pinyin else None for c in chars] if pinyin else None
+
+        data = json.dumps([htmlgen.TEMPLATE_VERSION, list(chars), n_boxes, n_pages,
+                           title, date, readings], ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key + ".htm")
+
+    # path of the cached sheet, or None if it isn't cached
+    def lookup(self, key):
+        path = self.entry_path(key)
+        try:
+            os.utime(path) # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    # store a rendered sheet under key
+    def put(self, key, text):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        path = self.entry_path(key)
+        with sitebuild.atomic_open(path, 'w') as f:
+            f.write(text)
+
+        if self.size is None:
+            self.size = sum(entry.stat().st_size for entry in os.scandir(self.path))
+        else:
+            self.size += os.path.getsize(path)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    # delete least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".htm"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort()
+
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= self.max_bytes:
+                break
+            os.remove(path)
+            self.size -= size
+
+    # htmlgen.charsheet, but served from the cache if the same sheet was rendered before
+    def charsheet(self, chars, n_boxes, n_pages, pinyin=None, f=None,
+                  title=htmlgen.CHARSHEET_TITLE, date=None):
+        if f is None:
+            f = sys.stdout
+        if date is None:
+            date = datetime.date.today().isoformat()
+
+        key = self.key(chars, n_boxes, n_pages, pinyin, title, date)
+        path = self.lookup(key)
+        if path:
+            with open(path) as cached:
+                f.write(cached.read())
+        else:
+            text = io.StringIO()
+            htmlgen.charsheet(chars, n_boxes, n_pages, pinyin, text, title, date)
+            f.write(text.getvalue())
+            self.put(key, text.getvalue())
+
+        return True
+
+    # htmlgen.render_charsheets, but only rendering the jobs that aren't cached
+    def render_charsheets(self, jobs, pinyin=None, workers=None):
+        misses = []
+        for job in jobs:
+            chars, n_boxes, n_pages, path, title, date = job
+            key = self.key(chars, n_boxes, n_pages, pinyin, title, date)
+            cached = self.lookup(key)
+            if cached:
+                shutil.copyfile(cached, path)
+            else:
+                misses.append((key, job))
+
+        htmlgen.render_charsheets([job for _, job in misses], pinyin, workers)
+
+        for key, job in misses:
+            with open(job[3]) as f:
+                self.put(key, f.read())
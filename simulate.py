@@ -0,0 +1,200 @@
+import itertools
+import json
+import pickle
+import multiprocessing
+import numpy as np
+
+import scheduler
+from database import TIMES_USED
+
+# Simulation harness for comparing generation policies without printing anything.
+#
+# A policy is run on an in-memory copy of the database for a number of cycles, with a fixed seed,
+# and the selections are summarised so different policies/parameters can be compared:
+#   coverage            fraction of non-blacklisted characters selected at least once
+#   full_coverage_cycle the simulated cycle on which every character had been selected, or None
+#   duplicates          selections of characters that had already been selected in the simulation
+#   intervals           distribution of the number of cycles between repeat selections
+#   char_intervals      distribution of each character's mean interval
+#
+# Policies are registered in POLICIES as functions that take the database copy and the policy's
+# parameters, and return a function selecting n_chars characters for the next cycle:
+#   select = policy(db, **params)
+#   chars  = select(n_chars, rng)
+
+def score_policy(db, **params):
+    def select(n_chars, rng):
+        return db.generate(n_chars, rng, **params)
+    return select
+
+def schedule_policy(db, **params):
+    # replace any existing scheduler so the parameters take effect from the current usage info
+    db.scheduler = scheduler.Scheduler.from_database(db, **params)
+    def select(n_chars, rng):
+        return db.schedule(n_chars)
+    return select
+
+POLICIES = {
+    "score": score_policy, # Database.generate
+    "sched": schedule_policy, # Database.schedule
+}
+
+# the parameters each policy takes
+POLICY_PARAMS = {
+    "score": ("occur_weight", "unused_boost"),
+    "sched": ("first_interval", "second_interval", "ease"),
+}
+
+# parameters of the runs rather than the policy, all integers
+RUN_PARAMS = ("cycles", "n", "seed", "workers")
+
+USAGE = "Usage: simulate <policy> [cycles=N] [n=N] [seed=N,...] [workers=N] [param=value,...]"
+
+DEFAULT_CYCLES  = 365
+DEFAULT_N_CHARS = 30
+DEFAULT_SEED    = 0
+
+# percentiles of a list of numbers as a dict, or None if it is empty
+def distribution(values):
+    if not len(values):
+        return None
+    values = np.asarray(values, dtype=float)
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        "count": len(values),
+        "min":   float(values.min()),
+        "p10":   float(p10),
+        "p50":   float(p50),
+        "p90":   float(p90),
+        "max":   float(values.max()),
+        "mean":  float(values.mean()),
+    }
+
+# run a policy on a copy of db and return a report dict. db is not modified.
+# db may also be a pickled database (bytes), which avoids pickling it again for every run.
+def simulate(db, policy="score", params=None,
+             cycles=DEFAULT_CYCLES, n_chars=DEFAULT_N_CHARS, seed=DEFAULT_SEED):
+    params = params or dict()
+    db = pickle.loads(db if isinstance(db, bytes) else pickle.dumps(db))
+
+    rng = np.random.default_rng(seed)
+    select = POLICIES[policy](db, **params)
+
+    pool = [c for c in db.chars if c not in db.blacklist]
+
+    # cycles on which each character was selected during the simulation
+    selected = dict()
+    full_coverage_cycle = None
+
+    for cycle in range(1, cycles + 1):
+        for c in select(n_chars, rng):
+            if c not in selected:
+                selected[c] = []
+            selected[c].append(cycle)
+        if full_coverage_cycle is None and len(selected) >= len(pool):
+            full_coverage_cycle = cycle
+
+    intervals = []
+    char_intervals = []
+    for used_on in selected.values():
+        if len(used_on) > 1:
+            gaps = np.diff(used_on)
+            intervals.extend(gaps)
+            char_intervals.append(gaps.mean())
+
+    n_selections = sum(map(len, selected.values()))
+
+    return {
+        "policy":              policy,
+        "params":              params,
+        "seed":                seed,
+        "cycles":              cycles,
+        "n_chars":             n_chars,
+        "pool":                len(pool),
+        "coverage":            len(selected) / len(pool) if len(pool) else 0,
+        "full_coverage_cycle": full_coverage_cycle,
+        "selections":          n_selections,
+        "duplicates":          n_selections - len(selected),
+        "max_times_used":      max([db.chars[c][TIMES_USED] for c in pool], default=0),
+        "intervals":           distribution(intervals),
+        "char_intervals":      distribution(char_intervals),
+    }
+
+#########################
+# Parameter sweeps      #
+#########################
+
+# the pickled database is sent to each worker once, rather than with every run
+worker_db = None
+
+def init_worker(db_bytes):
+    global worker_db
+    worker_db = db_bytes
+
+def run_worker(kwargs):
+    return simulate(worker_db, **kwargs)
+
+# expand a dict of parameter names to lists of values into a list of dicts, one per combination
+def grid(params):
+    names = list(params.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*params.values())]
+
+# run a policy for every combination of parameters and seeds in a process pool.
+# yields the reports in the same order as grid(params), each seed in turn.
+def sweep(db, policy, params, seeds=(DEFAULT_SEED,),
+          cycles=DEFAULT_CYCLES, n_chars=DEFAULT_N_CHARS, workers=None):
+    runs = [dict(policy=policy, params=p, cycles=cycles, n_chars=n_chars, seed=seed)
+            for p in grid(params) for seed in seeds]
+
+    with multiprocessing.Pool(workers, init_worker, (pickle.dumps(db),)) as pool:
+        yield from pool.imap(run_worker, runs)
+
+# parse "key=value" command line arguments. values may be comma-separated lists to sweep over.
+# raises ValueError with a message for the user if an argument is malformed or unknown.
+def parse_args(args, policy):
+    parsed = dict()
+    for arg in args:
+        key, sep, value = arg.partition('=')
+        if not sep or not key or not value:
+            raise ValueError("Expected key=value, got '{}'".format(arg))
+        if key not in RUN_PARAMS and key not in POLICY_PARAMS[policy]:
+            raise ValueError("Unknown parameter '{}', expected one of: {}".format(
+                key, ", ".join(RUN_PARAMS + POLICY_PARAMS[policy])))
+        try:
+            values = [float(v) if '.' in v else int(v) for v in value.split(',')]
+        except ValueError:
+            raise ValueError("Bad value for {}: '{}'".format(key, value))
+        if key in RUN_PARAMS and not all(isinstance(v, int) for v in values):
+            raise ValueError("{} must be an integer".format(key))
+        parsed[key] = values
+    return parsed
+
+# main.py simulate <policy> [cycles=N] [n=N] [seed=N,...] [workers=N] [param=value,...]
+# prints one JSON report per line
+def main(db, args):
+    policy = args[0] if len(args) else "score"
+    if policy not in POLICIES:
+        print("Unknown policy '{}', expected one of: {}".format(policy, ", ".join(POLICIES)))
+        return False
+
+    try:
+        params = parse_args(args[1:], policy)
+    except ValueError as e:
+        print(e)
+        print(USAGE)
+        return False
+    cycles  = params.pop("cycles",  [DEFAULT_CYCLES])[0]
+    n_chars = params.pop("n",       [DEFAULT_N_CHARS])[0]
+    workers = params.pop("workers", [None])[0]
+    seeds   = params.pop("seed",    [DEFAULT_SEED])
+
+    runs = len(grid(params)) * len(seeds)
+    if runs == 1:
+        reports = [simulate(db, policy, grid(params)[0], cycles, n_chars, seeds[0])]
+    else:
+        reports = sweep(db, policy, params, seeds, cycles, n_chars, workers)
+
+    for report in reports:
+        print(json.dumps(report), flush=True)
+
+    return False
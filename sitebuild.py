@@ -0,0 +1,123 @@
+import os
+import io
+import gzip
+import json
+import hashlib
+import contextlib
+import concurrent.futures
+
+import htmlgen
+
+# Incremental builds of directories of generated pages, for putting on a web server.
+#
+# Each page has a key, the SHA256 of everything its content depends on (its inputs). The keys of
+# the pages that were built are stored in manifest.json in the output directory, so on the next
+# build only pages whose key changed (or whose file is missing) are built again.
+#
+# Pages are written to a temporary file which is then renamed over the old page, so the web
+# server never sees a half-written page. A gzipped copy (page.htm.gz) is written next to each
+# page, for servers that can send precompressed files (e.g. nginx's gzip_static), and an index
+# page linking to every page is kept up to date.
+
+MANIFEST = "manifest.json"
+INDEX    = "index.htm"
+
+class Page:
+    # inputs must be JSON serialisable. render is called without arguments and returns the page
+    # text, and is only called if the page needs building.
+    def __init__(self, filename, title, inputs, render):
+        self.filename = filename
+        self.title    = title
+        self.key      = hash_inputs(inputs)
+        self.render   = render
+
+def hash_inputs(inputs):
+    data = json.dumps(inputs, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+# open a temporary file to write path through (mode and kwargs are passed to open), which is
+# synced and renamed over path when the block ends, so the file is either the old or the new
+# version even after a crash. If the block raises, the temporary file is removed instead.
+@contextlib.contextmanager
+def atomic_open(path, mode='wb', **kwargs):
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+# write data to path via a temporary file, so the file is either the old or the new version
+def write_atomic(path, data):
+    with atomic_open(path) as f:
+        f.write(data)
+
+# write a page and its gzipped copy. mtime=0 makes the .gz the same every time for the same page.
+def write_page(path, text):
+    data = text.encode('utf-8')
+    write_atomic(path, data)
+    write_atomic(path + ".gz", gzip.compress(data, mtime=0))
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict() # no manifest (or a broken one) means everything is rebuilt
+
+def index_page(pages, title):
+    entries = [(page.filename, page.title) for page in pages]
+    def render():
+        f = io.StringIO()
+        htmlgen.index(entries, f, title)
+        return f.getvalue()
+    return Page(INDEX, title, [htmlgen.TEMPLATE_VERSION, title, entries], render)
+
+# build the pages that are out of date, plus the index. Returns the list of pages that were built.
+#
+# Rendering is done in this thread, so render functions don't need to be thread safe. Writing
+# and compressing (where the time actually goes) is done by a pool of threads; zlib and file I/O
+# release the GIL.
+def build(out_dir, pages, index_title, workers=None):
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    manifest = load_manifest(out_dir)
+
+    pages = pages + [index_page(pages, index_title)]
+    stale = [page for page in pages
+             if manifest.get(page.filename) != page.key
+             or not os.path.isfile(os.path.join(out_dir, page.filename))]
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(write_page, os.path.join(out_dir, page.filename), page.render())
+                   for page in stale]
+        for future in futures:
+            future.result() # raise any exceptions from writing
+
+    # pages that are no longer built are forgotten, but their files are left alone
+    manifest = {page.filename: page.key for page in pages}
+    write_atomic(os.path.join(out_dir, MANIFEST),
+                 json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+
+    return stale
+
+# add gzipped copies and an index to a directory of pages that were written some other way
+# (e.g. by htmlgen.render_charsheets). entries is a list of (filename, title).
+def publish(out_dir, entries, index_title, workers=None):
+    def compress(filename):
+        path = os.path.join(out_dir, filename)
+        with open(path, 'rb') as f:
+            write_atomic(path + ".gz", gzip.compress(f.read(), mtime=0))
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        list(executor.map(compress, [filename for filename, _ in entries]))
+
+    index = index_page([Page(filename, title, None, None) for filename, title in entries],
+                       index_title)
+    write_page(os.path.join(out_dir, index.filename), index.render())
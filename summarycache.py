@@ -0,0 +1,97 @@
+import os
+import pickle
+
+import cedict
+import htmlgen
+import sitebuild
+import resources
+from resources import hash_file
+
+# Cache of rendered summary table rows (htmlgen.summary_rows), kept between runs.
+#
+# Most words appear in many labels' summaries, so rather than loading CEDICT and rendering every
+# word of every summary, the rows for each word are cached. CEDICT is only loaded if a word isn't
+# in the cache.
+#
+# The cache is only valid for the CEDICT file (and templates) it was made with, so it stores the
+# SHA256 of the CEDICT file and htmlgen.TEMPLATE_VERSION, and is emptied if either changes. As
+# hashing CEDICT takes a moment, its size and modification time are also stored, and the file is
+# only hashed again if those change. If only the resource bundle was installed, the hash of the
+# CEDICT file it was built from is used.
+
+CACHE_PATH = "summary_cache.pickle"
+
+class SummaryCache:
+    def __init__(self, path=CACHE_PATH, cedict_path=cedict.DEFAULT_PATH):
+        self.path        = path
+        self.cedict_path = cedict_path
+        self.dirty       = False
+        self.hits        = 0
+        self.misses      = 0
+
+        cached = None
+        if os.path.isfile(path):
+            try:
+                with open(path, 'rb') as f:
+                    cached = pickle.load(f)
+            except Exception as e:
+                print("Failed to load summary cache, starting again:", e)
+
+        if not os.path.isfile(cedict_path):
+            self.stat = None
+            self.cedict_hash = resources.get().source_hash("cedict")
+        else:
+            stat = os.stat(cedict_path)
+            self.stat = (stat.st_size, stat.st_mtime_ns)
+            if cached and cached["stat"] == self.stat:
+                # CEDICT hasn't been touched, so it still has the same hash
+                self.cedict_hash = cached["cedict_hash"]
+            else:
+                self.cedict_hash = hash_file(cedict_path)
+
+        self.version = (self.cedict_hash, htmlgen.TEMPLATE_VERSION)
+        if cached and cached["version"] == self.version:
+            self.rows = cached["rows"]
+        else:
+            self.rows = dict() # word -> rows
+            self.dirty = True
+
+        self.defs = None
+
+    # the rows for each word, in order. CEDICT is only loaded (through load_defs) for words
+    # that aren't cached yet.
+    def get(self, words, load_defs):
+        output = []
+        for word in words:
+            if word in self.rows:
+                self.hits += 1
+            else:
+                self.misses += 1
+                if self.defs is None:
+                    self.defs = load_defs()
+                self.rows[word] = htmlgen.summary_rows(word, self.defs)
+                self.dirty = True
+            output.append(self.rows[word])
+        return output
+
+    # CEDICT was replaced by a release in which only the entries of words changed (see
+    # update-cedict in main.py), so only their rows are dropped rather than the whole cache
+    def dictionary_changed(self, words):
+        stat = os.stat(self.cedict_path)
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.cedict_hash = hash_file(self.cedict_path)
+        self.version = (self.cedict_hash, htmlgen.TEMPLATE_VERSION)
+        for word in words:
+            self.rows.pop(word, None)
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        # written atomically so an interrupted save doesn't lose the whole cache
+        with sitebuild.atomic_open(self.path) as f:
+            pickle.dump({"version":     self.version,
+                         "stat":        self.stat,
+                         "cedict_hash": self.cedict_hash,
+                         "rows":        self.rows}, f)
+        self.dirty = False
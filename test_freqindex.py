@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from database import Database
+from freqindex import FrequencyIndex
+
+# Regression tests for the order of tied characters in the frequency index (see freqindex.py):
+# they're ranked in the order they reached their count, which differs from the stable sort of
+# db.chars that mostfreq used before.
+
+class TieOrderTest(unittest.TestCase):
+    def add(self, db, text, label):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, label + ".txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            db.add_text(path, label)
+
+    def test_built_in_order_of_chars(self):
+        db = Database()
+        self.add(db, "甲乙丙", "L1")
+        self.assertEqual([c for _, c, _ in db.frequency_index().ranked()], ["甲", "乙", "丙"])
+
+    def test_ties_in_order_count_was_reached(self):
+        db = Database()
+        self.add(db, "甲乙", "L1")
+        index = db.frequency_index()
+        self.add(db, "乙甲", "L2")
+        # both occurred twice, and 乙 got there first; sorting db.chars would put 甲 first
+        self.assertEqual(list(index.ranked()), [(1, "乙", 2), (2, "甲", 2)])
+        self.assertEqual(index.rank(2), 1)
+
+    def test_increment_moves_to_end_of_bucket(self):
+        index = FrequencyIndex()
+        for c in "甲乙丙":
+            index.add(c, 1)
+        index.increment("甲", 2)
+        index.add("丁", 2)
+        self.assertEqual([c for _, c, _ in index.ranked()], ["甲", "丁", "乙", "丙"])
+
+if __name__ == "__main__":
+    unittest.main()
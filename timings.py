@@ -0,0 +1,69 @@
+import sys
+import time
+import json
+import contextlib
+
+# Lightweight per-phase timers and counters for main.py --timings.
+#
+# Phases are always timed since it's just two perf_counter calls, but the report is only written
+# when asked for. A phase can be entered more than once (e.g. rendering each sheet of a revision
+# pack); its time is accumulated and the number of calls counted.
+#
+# The report has the same "results" layout as the benchmark output, so a run can be compared
+# against another with `python3 -m bench compare`.
+
+class Timings:
+    def __init__(self):
+        self.phases   = dict() # name -> [seconds, calls]
+        self.counters = dict() # name -> integer
+        self.start    = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if name not in self.phases:
+                self.phases[name] = [0, 0]
+            self.phases[name][0] += elapsed
+            self.phases[name][1] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self, command=None):
+        return {
+            "meta": {
+                "time":    time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "command": command,
+            },
+            "results": {name: {"seconds": seconds, "calls": calls}
+                        for name, (seconds, calls) in self.phases.items()},
+            "counters":       self.counters,
+            "total_seconds":  time.perf_counter() - self.start,
+            "peak_rss_bytes": peak_rss(),
+        }
+
+    # write the report as JSON to path, or to stderr (stdout may be the generated HTML)
+    def write(self, path=None, command=None):
+        report = json.dumps(self.report(command), indent=1)
+        if path:
+            with open(path, 'w') as f:
+                f.write(report)
+        else:
+            sys.stderr.write(report + "\n")
+
+# peak resident set size of this process in bytes, or None if it can't be found
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None # not available on Windows
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+# the instance used by main.py
+timings = Timings()
@@ -0,0 +1,154 @@
+import os
+import time
+import tempfile
+import subprocess
+
+import resources
+from database import load_db, save_db, MergeConflict
+
+# Watches an inbox directory and adds the files put in it, so new class material doesn't need
+# add_pdf.sh and a label typed in by hand.
+#
+#   main.py watch [inbox] [--interval=SECONDS] [--readings]
+#
+# The label of each file is its name without the extension (e.g. "L12.pdf" is added as "L12").
+# Text files are added as they are and PDFs are converted with pdftotext first. Files are added
+# with add_text, so one that has been added before (under any label) isn't added again, and is
+# never relabeled. --readings counts the readings of heteronyms, like add --readings.
+#
+# The inbox is polled every interval seconds, only looking at the size and modification time of
+# each file (nothing is read or hashed until a file is added). A file is only added once these
+# haven't changed between two polls, so files that are still being copied in are left alone, and
+# is added again if it changes later. Everything that arrives together is added before saving
+# once, when a poll finds nothing new.
+#
+# If another run saved a conflicting change in the meantime, the database is loaded again and the
+# unsaved files are added to it again before saving.
+
+INBOX         = "inbox"
+POLL_INTERVAL = 5
+TEXT_SUFFIXES = (".txt",)
+PDF_SUFFIXES  = (".pdf",)
+
+def label_for(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def is_candidate(name):
+    # hidden files and partial downloads aren't material
+    if name.startswith('.') or name.endswith('~'):
+        return False
+    return name.lower().endswith(TEXT_SUFFIXES + PDF_SUFFIXES)
+
+class Watcher:
+    def __init__(self, db, inbox=INBOX, save=save_db, segmenter=None, load=load_db):
+        self.db        = db
+        self.inbox     = inbox
+        self.save      = save
+        self.load      = load
+        self.segmenter = segmenter
+        self.seen      = dict() # path -> (size, mtime_ns) when it was added
+        self.pending   = dict() # path -> (size, mtime_ns) at the last poll, if not added yet
+        self.unsaved   = []     # files added since the last save
+
+    # the files whose size and modification time are the same as at the last poll
+    def scan(self):
+        ready = []
+        stats = dict()
+        with os.scandir(self.inbox) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_candidate(entry.name):
+                    continue
+                stat = entry.stat()
+                stats[entry.path] = (stat.st_size, stat.st_mtime_ns)
+
+        for path, stat in sorted(stats.items()):
+            if self.seen.get(path) == stat:
+                continue
+            if self.pending.get(path) == stat:
+                ready.append(path)
+            self.pending[path] = stat
+        # forget files that were removed before they were added
+        self.pending = {path: stat for path, stat in self.pending.items() if path in stats}
+        return ready
+
+    # add a file, returning whether the database changed
+    def ingest(self, path):
+        label = label_for(path)
+        print("Adding {} as '{}'".format(path, label))
+        if not path.lower().endswith(PDF_SUFFIXES):
+            return self.db.add_text(path, label, relabel=False, segmenter=self.segmenter)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            text_path = os.path.join(tmp_dir, "text.txt")
+            try:
+                subprocess.run(["pdftotext", path, text_path], check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print("Failed to convert {}: {}".format(path, e))
+                return False
+            return self.db.add_text(text_path, label, relabel=False, segmenter=self.segmenter)
+
+    # one poll: add the files that are ready, or save if nothing arrived
+    def poll(self):
+        ready = self.scan()
+        for path in ready:
+            if self.ingest(path):
+                self.unsaved.append(path)
+            self.seen[path] = self.pending.pop(path)
+
+        if not ready and not self.pending and self.unsaved:
+            self.flush()
+
+    def flush(self):
+        if not self.unsaved:
+            return
+        print("Saving {} added file(s)".format(len(self.unsaved)))
+        try:
+            saved = self.save(self.db, raise_conflicts=True)
+        except MergeConflict as e:
+            print("Another run made a conflicting change ({}), adding the files again".format(e))
+            saved = self.reapply() and self.save(self.db)
+        if saved:
+            self.unsaved = []
+
+    # load the database as the other run saved it and add the unsaved files to it
+    def reapply(self):
+        db = self.load()
+        if not db:
+            return False
+        self.db = db
+        for path in self.unsaved:
+            if os.path.isfile(path):
+                self.ingest(path)
+        return True
+
+    def run(self, interval=POLL_INTERVAL):
+        print("Watching {} every {} seconds".format(self.inbox, interval))
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        finally:
+            self.flush()
+
+def main(db, args, save=save_db, load=load_db):
+    args = list(args)
+    interval = POLL_INTERVAL
+    segmenter = None
+    for arg in args[:]:
+        if arg.startswith("--interval="):
+            interval = float(arg[len("--interval="):])
+            args.remove(arg)
+        elif arg == "--readings":
+            segmenter = resources.load_segmenter()
+            args.remove(arg)
+    inbox = args[0] if args else INBOX
+
+    if not os.path.isdir(inbox):
+        print("Inbox directory '{}' does not exist".format(inbox))
+        return False
+
+    try:
+        Watcher(db, inbox, save, segmenter, load).run(interval)
+    except KeyboardInterrupt:
+        print("Stopped")
+    return False # the watcher saves the database itself